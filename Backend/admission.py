@@ -0,0 +1,114 @@
+"""
+Bounded admission queue in front of speech recognition.
+
+At most `max_concurrent` decodes run at once. Requests beyond that wait in a
+priority queue of at most `max_queue` entries (interactive before batch) and
+are turned away with Overloaded when the queue is full or they have waited
+longer than `max_wait` seconds, so a burst gets fast 503s instead of every
+request slowing down.
+"""
+
+import math
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Lower ranks are admitted first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Recognition is busy, please retry shortly")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Batch requests may only fill `batch_queue_share` of the queue, so
+    interactive requests always find room behind a batch backlog.
+    """
+
+    def __init__(self, max_concurrent, max_queue, max_wait=5.0, batch_queue_share=0.5):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.batch_queue_share = batch_queue_share
+        self.lock = threading.Lock()
+        self.waiters = []  # heap of [rank, sequence, event]
+        self.sequence = itertools.count()
+        self.in_flight = 0
+        # Recent decode time, used to estimate Retry-After
+        self.service_seconds = 1.0
+        self.admitted = {priority: 0 for priority in PRIORITIES}
+        self.rejected = {priority: 0 for priority in PRIORITIES}
+        self.waits = deque(maxlen=1000)
+
+    def queue_limit(self, priority):
+        if PRIORITIES[priority] == 0:
+            return self.max_queue
+        return int(self.max_queue * self.batch_queue_share)
+
+    def retry_after(self):
+        # Seconds for the current backlog to drain, rounded up
+        return max(1, math.ceil(self.service_seconds * (len(self.waiters) + 1) / self.max_concurrent))
+
+    def reject(self, priority):
+        self.rejected[priority] += 1
+        return Overloaded(self.retry_after())
+
+    @contextmanager
+    def admit(self, priority="interactive"):
+        queued_at = time.monotonic()
+        with self.lock:
+            if self.in_flight < self.max_concurrent and not self.waiters:
+                self.in_flight += 1
+                waiter = None
+            elif len(self.waiters) >= self.queue_limit(priority):
+                raise self.reject(priority)
+            else:
+                waiter = [PRIORITIES[priority], next(self.sequence), threading.Event()]
+                heapq.heappush(self.waiters, waiter)
+
+        if waiter is not None and not waiter[2].wait(self.max_wait):
+            with self.lock:
+                # The slot may have been handed over just as the wait timed out
+                if not waiter[2].is_set():
+                    self.waiters.remove(waiter)
+                    heapq.heapify(self.waiters)
+                    raise self.reject(priority)
+
+        started = time.monotonic()
+        with self.lock:
+            self.admitted[priority] += 1
+            self.waits.append(started - queued_at)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.service_seconds = 0.8 * self.service_seconds + 0.2 * (time.monotonic() - started)
+                if self.waiters:
+                    # Hand the slot straight to the next waiter so nobody can jump the queue
+                    heapq.heappop(self.waiters)[2].set()
+                else:
+                    self.in_flight -= 1
+
+    def stats(self):
+        with self.lock:
+            waits = sorted(self.waits)
+            return {
+                "in_flight": self.in_flight,
+                "queued": len(self.waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": dict(self.admitted),
+                "rejected": dict(self.rejected),
+                "queue_wait_ms": {
+                    "avg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0,
+                    "p95": round(waits[int(len(waits) * 0.95)] * 1000, 2) if waits else 0,
+                    "max": round(waits[-1] * 1000, 2) if waits else 0
+                }
+            }
@@ -0,0 +1,148 @@
+"""
+Optional archive of attempt recordings, so accuracy can be recomputed later.
+
+Set AUDIO_ARCHIVE_DIR to turn it on. A route hands the uploaded bytes to
+AudioArchive.submit(), which only queues them: a background thread
+decodes each clip to 16-bit mono PCM, compresses it (zstd when the
+zstandard package is installed, gzip otherwise) and appends a line to the
+day's index. When the queue is full the clip is dropped and counted rather
+than slowing the request down.
+
+Layout:
+    <dir>/<YYYY-MM-DD>/<audio_key>.pcm.zst
+    <dir>/<YYYY-MM-DD>/index.ndjson   {"key", "email", "target_word", "sample_rate", "seconds", "model", "file"}
+
+rescore.py streams these clips back through a speech model.
+"""
+
+import io
+import os
+import gzip
+import json
+import uuid
+import queue
+import threading
+from datetime import datetime
+
+from history import DATE_FORMAT
+from recognition import read_pcm_chunks
+
+try:
+    import zstandard
+except ImportError:  # gzip clips only
+    zstandard = None
+
+INDEX_FILE = 'index.ndjson'
+
+
+def new_audio_key():
+    return uuid.uuid4().hex
+
+
+def compress_pcm(pcm, level=3):
+    if zstandard is not None:
+        return '.pcm.zst', zstandard.ZstdCompressor(level=level).compress(pcm)
+    return '.pcm.gz', gzip.compress(pcm, compresslevel=6, mtime=0)
+
+
+def read_clip(path):
+    with open(path, 'rb') as f:
+        payload = f.read()
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+    return gzip.decompress(payload)
+
+
+def iter_index(archive_dir, since=None):
+    """Archived clips (index entries with the clip's full path), oldest day first."""
+    if not os.path.isdir(archive_dir):
+        return
+    for day in sorted(os.listdir(archive_dir)):
+        index_path = os.path.join(archive_dir, day, INDEX_FILE)
+        if (since and day < since.strftime(DATE_FORMAT)) or not os.path.exists(index_path):
+            continue
+        with open(index_path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield dict(entry, day=day, path=os.path.join(archive_dir, day, entry['file']))
+
+
+class AudioArchive:
+    def __init__(self, directory, max_pending=64):
+        self.directory = directory
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.archived = 0
+        self.dropped = 0
+        self.failed = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.thread = threading.Thread(target=self.run, name='audio-archive', daemon=True)
+        self.thread.start()
+
+    def submit(self, key, audio, **metadata):
+        """Queue a recording (the uploaded bytes) under an attempt's audio key. Never blocks."""
+        try:
+            self.pending.put_nowait((key, audio, metadata, datetime.now()))
+            return True
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                self.pending.task_done()
+                return
+            try:
+                self.write(*item)
+            except Exception:  # a bad clip is counted, and the writer keeps going for the rest
+                with self.lock:
+                    self.failed += 1
+            finally:
+                self.pending.task_done()
+
+    def write(self, key, audio, metadata, received_at):
+        sample_rate, chunks = read_pcm_chunks(io.BytesIO(audio))
+        pcm = b''.join(chunks)
+        suffix, payload = compress_pcm(pcm)
+
+        day = received_at.strftime(DATE_FORMAT)
+        directory = os.path.join(self.directory, day)
+        os.makedirs(directory, exist_ok=True)
+        filename = key + suffix
+        with open(os.path.join(directory, filename), 'wb') as f:
+            f.write(payload)
+        # Only this thread appends to the index, so lines never interleave
+        entry = dict(metadata, key=key, sample_rate=sample_rate, seconds=round(len(pcm) / (sample_rate * 2), 3),
+                     file=filename)
+        with open(os.path.join(directory, INDEX_FILE), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+        with self.lock:
+            self.archived += 1
+            self.raw_bytes += len(pcm)
+            self.stored_bytes += len(payload)
+
+    def flush(self):
+        self.pending.join()
+
+    def close(self):
+        # Writes what is already queued, then stops the writer thread
+        self.pending.put(None)
+        self.thread.join()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "archived": self.archived,
+                "pending": self.pending.qsize(),
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "compression_ratio": round(self.stored_bytes / self.raw_bytes, 3) if self.raw_bytes else 0
+            }
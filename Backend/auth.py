@@ -0,0 +1,125 @@
+"""
+Password checks off the request threads, and signed login tokens.
+
+check_password_hash costs hundreds of milliseconds of CPU, so logins hand it
+to a small process pool. A request thread only waits on the result, and
+other routes keep being served while a whole class logs in. At most
+`max_queue` checks wait behind the running ones; past that a login gets
+LoginBusy (a 503 with Retry-After) instead of queueing without bound, and
+so does a check that doesn't finish within `timeout`.
+
+Logins also return a token signed with the app's SECRET_KEY that carries
+the user id, email, group, role and preferred model. Routes read it from
+`Authorization: Bearer <token>` without a database lookup, and decide from
+the group and role who may see a cohort's data.
+"""
+
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.security import check_password_hash
+
+TOKEN_SALT = 'spello-auth'
+# Short claim names keep the token compact
+TOKEN_CLAIMS = {'uid': '_id', 'email': 'email', 'grp': 'group', 'role': 'role', 'model': 'model'}
+# Set on the user document by hand; everyone else is a student
+ROLES = ('student', 'teacher', 'admin')
+
+
+class LoginBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Too many logins at once, please retry shortly")
+        self.retry_after = retry_after
+
+
+class PasswordVerifier:
+    """Runs check_password_hash on `workers` processes (inline when workers is 0)."""
+
+    def __init__(self, workers, max_queue, timeout=30.0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.executor = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.checks = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def pool(self):
+        # Started on the first login; spawn so the server's threads and models aren't forked
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+            return self.executor
+
+    def retry_after(self):
+        # Roughly how long the checks ahead of a new one take to clear (called with the lock held)
+        average = self.seconds / self.checks if self.checks else 0.5
+        return max(1, round(average * self.in_flight / max(1, self.workers)))
+
+    def verify(self, password_hash, password, check=check_password_hash):
+        with self.lock:
+            if self.in_flight >= self.workers + self.max_queue and self.workers > 0:
+                self.rejected += 1
+                raise LoginBusy(self.retry_after())
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return check(password_hash, password)
+            future = self.pool().submit(check, password_hash, password)
+            try:
+                return future.result(self.timeout)
+            except TimeoutError:
+                # The pool is backed up (or stuck); answer like a full queue rather than with an error
+                future.cancel()
+                with self.lock:
+                    self.timeouts += 1
+                    raise LoginBusy(self.retry_after())
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.checks += 1
+                self.seconds += time.perf_counter() - started
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "queued": max(0, self.in_flight - self.workers),
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "checks": self.checks,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "avg_check_ms": round(self.seconds / self.checks * 1000, 1) if self.checks else 0
+            }
+
+
+def serializer(secret_key):
+    return URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT)
+
+
+def issue_token(secret_key, user):
+    claims = {claim: user.get(field) for claim, field in TOKEN_CLAIMS.items() if user.get(field)}
+    claims['uid'] = str(user['_id'])
+    return serializer(secret_key).dumps(claims)
+
+
+def read_token(secret_key, token, max_age):
+    """The user fields from a valid token (keyed like the user document), or None."""
+    try:
+        claims = serializer(secret_key).loads(token, max_age=max_age)
+    except (BadSignature, SignatureExpired):
+        return None
+    return {field: claims.get(claim) for claim, field in TOKEN_CLAIMS.items()}
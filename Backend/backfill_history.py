@@ -0,0 +1,96 @@
+"""
+Backfill the per-day score history buckets (score_history collection) and
+each user's best accuracy per word (word_best_accuracy) from the scores
+arrays on existing user documents. The dashboard reads only these, so run
+this once after upgrading.
+
+By default only days that have no bucket yet are written ($setOnInsert),
+so the script is safe to re-run and to run while the app is serving
+traffic: buckets the app is already adding to are left alone. The one
+thing this can miss is a day whose bucket the app started after the
+earlier attempts of that day were saved (e.g. attempts made on the day of
+the upgrade, before it). Those buckets stay short until a --rebuild.
+
+--rebuild overwrites the totals of every bucket with the ones computed
+from the scores arrays. Attempts saved between the read and the write
+would be lost, so stop the app first.
+
+Usage:
+    MONGO_URI="mongodb+srv://..." python backfill_history.py
+    python backfill_history.py --mongo-uri mongodb://localhost:27017/spello_database --batch-size 500
+    python backfill_history.py --rebuild  # with the app stopped
+"""
+
+import os
+import sys
+import argparse
+
+from pymongo import MongoClient, UpdateOne
+
+from history import buckets_from_scores, ensure_history_indexes
+from storage import word_best_update
+
+
+def write_buckets(history, operations):
+    # Buckets created or changed; existing ones skipped by $setOnInsert aren't counted
+    result = history.bulk_write(operations, ordered=False)
+    return result.upserted_count + result.modified_count
+
+
+def backfill(users, history, batch_size=1000, rebuild=False):
+    ensure_history_indexes(history)
+    # Only missing buckets, unless rebuilding with the app stopped
+    operator = "$set" if rebuild else "$setOnInsert"
+    # Best accuracies only ever go up between rescorings, so $max is safe alongside the app
+    best_operator = "$set" if rebuild else "$max"
+    operations = []
+    user_operations = []
+    users_done = 0
+    buckets_written = 0
+
+    cursor = users.find({"$or": [{"scores.0": {"$exists": True}}, {"archived_summary": {"$exists": True}}]},
+                        {"email": 1, "scores.timestamp": 1, "scores.accuracy": 1, "scores.score": 1,
+                         "scores.target_word": 1, "archived_summary.best_accuracy": 1})
+    for user in cursor.batch_size(100):
+        scores = user.get("scores", [])
+        for bucket in buckets_from_scores(user["email"], scores):
+            operations.append(
+                UpdateOne({"email": bucket["email"], "day": bucket["day"]}, {operator: bucket}, upsert=True))
+        best = word_best_update(scores, user.get("archived_summary"))
+        if best:
+            user_operations.append(UpdateOne({"_id": user["_id"]}, {best_operator: best}))
+        users_done += 1
+        if len(operations) >= batch_size:
+            buckets_written += write_buckets(history, operations)
+            operations = []
+        if len(user_operations) >= batch_size:
+            users.bulk_write(user_operations, ordered=False)
+            user_operations = []
+
+    if operations:
+        buckets_written += write_buckets(history, operations)
+    if user_operations:
+        users.bulk_write(user_operations, ordered=False)
+    return users_done, buckets_written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill score history buckets and best word accuracies.')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI'), help='MongoDB connection string')
+    parser.add_argument('--batch-size', type=int, default=1000, help='buckets per bulk write')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='overwrite existing buckets and best accuracies too (stop the app first, '
+                             'or attempts saved meanwhile are lost)')
+    args = parser.parse_args(argv)
+
+    if not args.mongo_uri:
+        parser.error("--mongo-uri or MONGO_URI is required")
+
+    db = MongoClient(args.mongo_uri).get_default_database('spello_database')
+    users_done, buckets_written = backfill(db.sp1, db.score_history, args.batch_size, args.rebuild)
+    print(f"Backfilled {buckets_written} day buckets and the best word accuracies for {users_done} users")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
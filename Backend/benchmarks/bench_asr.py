@@ -0,0 +1,269 @@
+"""
+ASR throughput benchmark for the Vosk recognition path used by /speech-to-text.
+
+Generates deterministic synthetic PCM clips of varying length, silence ratio
+and sample rate, streams them through recognition.transcribe() single-threaded
+and with several worker threads (one recognizer per thread, shared model), and
+reports real-time factor, p50/p99 latency, decodes per second and peak memory.
+
+Usage:
+    python benchmarks/bench_asr.py
+    python benchmarks/bench_asr.py --lengths 1 3 10 --silence 0 0.5 0.8 --rates 16000 8000
+    python benchmarks/bench_asr.py --threads 1 2 4 8 --repeats 20 --json results.json
+    python benchmarks/bench_asr.py --write-fixtures fixtures/   # also save the clips as WAV
+    python benchmarks/bench_asr.py --codecs wav flac ogg-opus --threads 1
+
+With --codecs each clip is also encoded in the given upload formats and the
+upload size and in-process decode cost (before recognition) are reported.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import wave
+import random
+import resource
+import argparse
+import platform
+import threading
+from io import BytesIO
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import vosk
+
+# Make recognition.py importable when the script is run from any directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from recognition import SAMPLE_RATE, np, read_pcm_chunks, soundfile, transcribe  # noqa: E402
+
+DEFAULT_MODEL_PATH = os.path.join(BACKEND_DIR, 'vosk-model-small-en-us-0.15')
+
+# soundfile (format, subtype) for each upload codec accepted by /speech-to-text
+CODECS = {
+    'wav': None,
+    'flac': ('FLAC', 'PCM_16'),
+    'ogg-vorbis': ('OGG', 'VORBIS'),
+    'ogg-opus': ('OGG', 'OPUS'),
+}
+
+
+def make_clip(seconds, silence_ratio, sample_rate, seed=0):
+    """Deterministic 16-bit mono PCM clip: a voiced burst padded with near-silence."""
+    rng = random.Random(seed)
+    total = int(seconds * sample_rate)
+    voiced = int(total * (1 - silence_ratio))
+    lead = (total - voiced) // 2
+
+    samples = array('h', [0]) * total
+    # Low-level background noise everywhere
+    for i in range(total):
+        samples[i] = int(rng.gauss(0, 60))
+
+    # Harmonic "vowel" with a syllable-rate envelope and a drifting pitch
+    phase = 0.0
+    for i in range(voiced):
+        t = i / sample_rate
+        pitch = 140 + 30 * math.sin(2 * math.pi * 0.7 * t)
+        phase += 2 * math.pi * pitch / sample_rate
+        envelope = 0.5 * (1 - math.cos(2 * math.pi * 4 * t))
+        value = sum(math.sin(k * phase) / k for k in (1, 2, 3, 5))
+        samples[lead + i] = max(-32768, min(32767, int(samples[lead + i] + 6000 * envelope * value)))
+
+    if sys.byteorder != 'little':
+        samples.byteswap()
+    return samples.tobytes()
+
+
+def write_wav(path, pcm, sample_rate):
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(math.ceil(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def peak_memory_mb():
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class RecognizerPool:
+    """One recognizer per thread and sample rate, all sharing the loaded model."""
+
+    def __init__(self, model):
+        self.model = model
+        self.local = threading.local()
+
+    def get(self, sample_rate):
+        recognizers = getattr(self.local, 'recognizers', None)
+        if recognizers is None:
+            recognizers = self.local.recognizers = {}
+        if sample_rate not in recognizers:
+            recognizers[sample_rate] = vosk.KaldiRecognizer(self.model, sample_rate)
+        return recognizers[sample_rate]
+
+
+def decode(pool, clip):
+    recognizer = pool.get(clip['sample_rate'])
+    started = time.perf_counter()
+    _, chunks = read_pcm_chunks(BytesIO(clip['pcm']))
+    transcribe(recognizer, chunks)
+    return time.perf_counter() - started
+
+
+def encode_clip(clip, codec):
+    buffer = BytesIO()
+    if CODECS[codec] is None:
+        write_wav(buffer, clip['pcm'], clip['sample_rate'])
+    else:
+        audio_format, subtype = CODECS[codec]
+        samples = np.frombuffer(clip['pcm'], dtype='<i2')
+        soundfile.write(buffer, samples, clip['sample_rate'], subtype=subtype, format=audio_format)
+    return buffer.getvalue()
+
+
+def run_codec_case(clip, codec, repeats):
+    # Upload size and the cost of decoding it to PCM chunks, without the recognizer
+    encoded = encode_clip(clip, codec)
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        _, chunks = read_pcm_chunks(BytesIO(encoded))
+        for _ in chunks:
+            pass
+        latencies.append(time.perf_counter() - started)
+    return {
+        'codec': codec,
+        'clip_seconds': clip['seconds'],
+        'sample_rate': clip['sample_rate'],
+        'upload_bytes': len(encoded),
+        'compression_ratio': len(clip['pcm']) / len(encoded),
+        'decode_ms_per_audio_sec': percentile(latencies, 50) * 1000 / clip['seconds']
+    }
+
+
+def run_case(pool, clip, threads, repeats):
+    # Runs repeats decodes per thread and returns the latency stats for the batch
+    jobs = [clip] * (repeats * threads)
+    started = time.perf_counter()
+    if threads == 1:
+        latencies = [decode(pool, job) for job in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            latencies = list(executor.map(lambda job: decode(pool, job), jobs))
+    wall = time.perf_counter() - started
+
+    return {
+        'clip_seconds': clip['seconds'],
+        'silence_ratio': clip['silence_ratio'],
+        'sample_rate': clip['sample_rate'],
+        'threads': threads,
+        'decodes': len(jobs),
+        'rtf': sum(latencies) / (clip['seconds'] * len(jobs)),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'decodes_per_sec': len(jobs) / wall,
+        'decodes_per_sec_per_thread': len(jobs) / wall / threads,
+        'peak_rss_mb': peak_memory_mb()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Vosk decode throughput and latency.')
+    parser.add_argument('--model-path', default=DEFAULT_MODEL_PATH, help='Vosk model directory')
+    parser.add_argument('--lengths', type=float, nargs='+', default=[1, 3, 10], help='clip lengths in seconds')
+    parser.add_argument('--silence', type=float, nargs='+', default=[0.0, 0.6], help='silence ratios (0-1)')
+    parser.add_argument('--rates', type=int, nargs='+', default=[SAMPLE_RATE], help='sample rates in Hz')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4], help='concurrency levels')
+    parser.add_argument('--repeats', type=int, default=10, help='decodes per thread per case')
+    parser.add_argument('--seed', type=int, default=1, help='fixture seed')
+    parser.add_argument('--write-fixtures', metavar='DIR', help='also write the generated clips as WAV files')
+    parser.add_argument('--codecs', nargs='+', choices=sorted(CODECS), default=[],
+                        help='also benchmark upload size and decode cost for these codecs')
+    parser.add_argument('--json', metavar='FILE', help='write the results as JSON')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model_path):
+        parser.error(f"Vosk model directory not found at: {args.model_path}")
+    if set(args.codecs) - {'wav'} and soundfile is None:
+        parser.error("--codecs needs the soundfile package installed")
+
+    vosk.SetLogLevel(-1)
+    memory_before_model = peak_memory_mb()
+    load_started = time.perf_counter()
+    model = vosk.Model(args.model_path)
+    load_seconds = time.perf_counter() - load_started
+    pool = RecognizerPool(model)
+
+    clips = []
+    for seconds in args.lengths:
+        for silence_ratio in args.silence:
+            for sample_rate in args.rates:
+                clip = {
+                    'seconds': seconds,
+                    'silence_ratio': silence_ratio,
+                    'sample_rate': sample_rate,
+                    'pcm': make_clip(seconds, silence_ratio, sample_rate, seed=args.seed)
+                }
+                clips.append(clip)
+                if args.write_fixtures:
+                    os.makedirs(args.write_fixtures, exist_ok=True)
+                    name = f"clip_{seconds:g}s_silence{silence_ratio:g}_{sample_rate}hz.wav"
+                    write_wav(os.path.join(args.write_fixtures, name), clip['pcm'], sample_rate)
+
+    print(f"model: {args.model_path}")
+    print(f"host: {platform.node()} {platform.machine()} cpus={os.cpu_count()} python={platform.python_version()}")
+    print(f"model load: {load_seconds:.2f}s, rss after load: {peak_memory_mb() - memory_before_model:.0f}MB over baseline\n")
+    print(f"{'len(s)':>6} {'silence':>7} {'rate':>6} {'thr':>4} {'RTF':>7} {'p50(ms)':>9} "
+          f"{'p99(ms)':>9} {'dec/s':>8} {'dec/s/thr':>9} {'peakMB':>7}")
+
+    results = []
+    for clip in clips:
+        for threads in args.threads:
+            row = run_case(pool, clip, threads, args.repeats)
+            results.append(row)
+            print(f"{row['clip_seconds']:>6g} {row['silence_ratio']:>7g} {row['sample_rate']:>6} {threads:>4} "
+                  f"{row['rtf']:>7.3f} {row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f} "
+                  f"{row['decodes_per_sec']:>8.2f} {row['decodes_per_sec_per_thread']:>9.2f} "
+                  f"{row['peak_rss_mb']:>7.0f}")
+
+    codec_results = []
+    if args.codecs:
+        print(f"\n{'codec':>10} {'len(s)':>6} {'rate':>6} {'bytes':>9} {'ratio':>6} {'decode ms/s':>12}")
+        for clip in clips:
+            if clip['silence_ratio'] != args.silence[0]:
+                continue
+            for codec in args.codecs:
+                row = run_codec_case(clip, codec, args.repeats)
+                codec_results.append(row)
+                print(f"{codec:>10} {row['clip_seconds']:>6g} {row['sample_rate']:>6} {row['upload_bytes']:>9} "
+                      f"{row['compression_ratio']:>6.1f} {row['decode_ms_per_audio_sec']:>12.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'model_path': args.model_path,
+                'host': platform.node(),
+                'machine': platform.machine(),
+                'cpu_count': os.cpu_count(),
+                'model_load_seconds': load_seconds,
+                'results': results,
+                'codecs': codec_results
+            }, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
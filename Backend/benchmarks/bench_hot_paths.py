@@ -0,0 +1,245 @@
+"""
+Micro-benchmarks for the scoring and dashboard hot paths.
+
+Runs calculate_accuracy, calculate_score, the get-target-word candidate
+building, the dashboard aggregation loops and the history bucket trend reads
+over synthetic score histories, with MongoDB replaced by mongomock. Results
+are compared against the checked-in baseline (benchmarks/baseline.json) and
+the script exits with a non-zero status when any case is slower than the
+baseline by more than the allowed threshold. The app is built with a fake
+model loader and recognizer, so no Vosk model is needed.
+
+Timings are stored and compared as multiples of a fixed calibration loop
+timed in the same run, so the baseline holds on faster or slower machines
+(the microsecond columns show the baseline scaled to this machine). A case
+fails when it is more than --threshold (default 25%) slower than that; rerun
+once before chasing a single noisy case. Record a new baseline with
+--update-baseline when a change is meant to move a case, or adds one, and
+commit baseline.json with the change. Runs with --sizes only update the
+cases they ran.
+
+Usage:
+    python benchmarks/bench_hot_paths.py                    # compare against baseline
+    python benchmarks/bench_hot_paths.py --update-baseline  # record a new baseline
+    python benchmarks/bench_hot_paths.py --sizes 10 1000 --threshold 0.5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+import mongomock
+
+# Make app.py importable when the script is run from any directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import app as spello  # noqa: E402
+from history import buckets_from_scores, read_trend  # noqa: E402
+from storage import word_best_update  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SIZES = [10, 1000, 100000]
+DEFAULT_THRESHOLD = 0.25
+BENCH_EMAIL = 'bench@example.com'
+
+
+def bench_app(db):
+    # Fakes instead of the Vosk model, so the benchmark runs without one installed
+    return spello.create_app({'TESTING': True, 'VOCABULARY_CHECK_MODEL': False}, db=db,
+                             model_loader=lambda path: None, recognizer_factory=lambda model, sample_rate: None)
+
+
+def make_scores(size, seed=42):
+    # Deterministic synthetic history spread over the last 60 days
+    rng = random.Random(seed)
+    words = list(spello.vocabulary.current.words)
+    today = datetime.now().date()
+    scores = []
+    for _ in range(size):
+        target_word = rng.choice(words)
+        accuracy = round(rng.uniform(0, 100), 2)
+        scores.append({
+            'target_word': target_word,
+            'spoken_word': target_word,
+            'accuracy': accuracy,
+            'score': spello.calculate_score(accuracy, 1),
+            'timestamp': datetime.combine(today - timedelta(days=rng.randint(0, 59)), datetime.min.time())
+        })
+    return scores
+
+
+def calibration_loop():
+    # Fixed interpreter work (string, dict and arithmetic) that every result is measured against
+    counts = {}
+    for i in range(20000):
+        key = str(i % 97)
+        counts[key] = counts.get(key, 0) + i * 3
+    return counts
+
+
+def time_call(func, min_time=0.2, max_repeats=10000):
+    # Median per-call time over enough repeats to fill min_time
+    func()  # warm up
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_repeats:
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+        if len(samples) >= 5 and time.perf_counter() - started >= min_time:
+            break
+    return statistics.median(samples)
+
+
+def bench_scoring():
+    rng = random.Random(7)
+    words = list(spello.vocabulary.current.words)
+    pairs = [(rng.choice(words), rng.choice(words)) for _ in range(100)]
+    accuracies = [rng.uniform(0, 100) for _ in range(100)]
+
+    def run_accuracy():
+        for target, spoken in pairs:
+            spello.calculate_accuracy(target, spoken)
+
+    def run_score():
+        for accuracy in accuracies:
+            spello.calculate_score(accuracy, 1)
+            spello.calculate_score(accuracy, 2)
+
+    return {
+        'calculate_accuracy[x100]': time_call(run_accuracy),
+        'calculate_score[x200]': time_call(run_score),
+    }
+
+
+def bench_candidates():
+    custom_words = ['Custom%d' % i for i in range(20)]
+    return {
+        'build_word_candidates[no_sounds]': time_call(
+            lambda: spello.build_word_candidates([], [])),
+        'build_word_candidates[two_sounds]': time_call(
+            lambda: spello.build_word_candidates(['p', 'b'], custom_words)),
+        'build_word_candidates[all_sounds]': time_call(
+            lambda: spello.build_word_candidates(list(spello.vocabulary.current.sound_words), custom_words)),
+    }
+
+
+def bench_dashboard(size):
+    scores = make_scores(size)
+    today = datetime.now().date()
+    mock_db = mongomock.MongoClient().db
+    mock_db.score_history.insert_many(buckets_from_scores(BENCH_EMAIL, scores))
+    week_ago = today - timedelta(days=6)
+    term_ago = today - timedelta(days=119)
+    results = {
+        'get_mastered_words[%d]' % size: time_call(lambda: spello.get_mastered_words(scores)),
+        'read_trend[week,%d]' % size: time_call(
+            lambda: read_trend(mock_db.score_history, BENCH_EMAIL, week_ago, today)),
+        'read_trend[term,%d]' % size: time_call(
+            lambda: read_trend(mock_db.score_history, BENCH_EMAIL, term_ago, today)),
+    }
+
+    # Full /dashboard request against mongomock, including the document fetch
+    mock_collection = mock_db.sp1
+    mock_collection.insert_one({
+        'email': BENCH_EMAIL,
+        'name': 'Bench User',
+        'selected_sounds': ['p', 'b'],
+        'custom_words': [],
+        'total_score': 1500,
+        'level': 1,
+        'scores': scores
+    })
+    # Backfilled like a live user, so the dashboard reads the kept best accuracies rather than the scores
+    mock_collection.update_one({'email': BENCH_EMAIL}, {'$max': word_best_update(scores)})
+    client = bench_app(mock_db).test_client()
+
+    def run_request():
+        response = client.get('/dashboard', query_string={'email': BENCH_EMAIL})
+        assert response.status_code == 200
+
+    results['GET /dashboard[%d]' % size] = time_call(run_request)
+    return results
+
+
+def run_benchmarks(sizes):
+    results = {}
+    # The vocabulary and candidate helpers use the app's resources
+    with bench_app(mongomock.MongoClient().db).app_context():
+        results.update(bench_scoring())
+        results.update(bench_candidates())
+        for size in sizes:
+            results.update(bench_dashboard(size))
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Returns the list of (case, baseline, current) that regressed beyond threshold, in calibration units
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get(case)
+        if previous and current > previous * (1 + threshold):
+            regressions.append((case, previous, current))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the scoring and dashboard hot paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='score history sizes to benchmark (default: 10 1000 100000)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown over the baseline as a fraction (default: 0.25)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline results file')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write the results as the new baseline instead of comparing')
+    args = parser.parse_args(argv)
+
+    calibration = time_call(calibration_loop)
+    results = run_benchmarks(args.sizes)
+    relative = {case: seconds / calibration for case, seconds in results.items()}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f).get('relative', {})
+
+    print(f"calibration loop: {calibration * 1e6:.1f}us\n")
+    print(f"{'case':45} {'baseline (us)':>15} {'current (us)':>15} {'change':>8}")
+    for case, current in relative.items():
+        previous = baseline.get(case)
+        change = f"{(current / previous - 1) * 100:+.1f}%" if previous else 'new'
+        previous_us = f"{previous * calibration * 1e6:.1f}" if previous else '-'
+        print(f"{case:45} {previous_us:>15} {current * calibration * 1e6:>15.1f} {change:>8}")
+
+    if args.update_baseline:
+        baseline.update(relative)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'recorded_at': datetime.now().strftime('%Y-%m-%d'),
+                'python': sys.version.split()[0],
+                'calibration_seconds': calibration,
+                'relative': dict(sorted(baseline.items()))
+            }, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(relative, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold * 100:.0f}%:")
+        for case, previous, current in regressions:
+            print(f"  {case}: {previous * calibration * 1e6:.1f}us -> {current * calibration * 1e6:.1f}us")
+        return 1
+
+    print(f"\nNo regressions beyond {args.threshold * 100:.0f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
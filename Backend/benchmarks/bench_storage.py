@@ -0,0 +1,130 @@
+"""
+Per-request latency of the game loop on the MongoDB and SQLite storage backends.
+
+Seeds one user with a practice history on each backend, then times
+/get-target-word, /attempt (with a fake recognizer, so only storage and
+scoring are measured) and /dashboard through the Flask test client. MongoDB
+is mongomock unless --mongo-uri points at a real server (use one with the
+same network distance as production, e.g. the Atlas cluster, to see the
+round-trip cost the embedded backend avoids).
+
+Usage:
+    python benchmarks/bench_storage.py
+    python benchmarks/bench_storage.py --mongo-uri mongodb://localhost:27017 --requests 500 --history 5000
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+import mongomock
+
+# Make app.py importable when the script is run from any directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app import create_app  # noqa: E402
+from provisioning import new_user  # noqa: E402
+
+BENCH_EMAIL = 'bench@example.com'
+WORDS = ['Pencil', 'Ball', 'Cup', 'Happy', 'Dog', 'Top']
+
+
+class FakeRecognizer:
+    def AcceptWaveform(self, data):
+        return False
+
+    def FinalResult(self):
+        return '{"text": "pencil"}'
+
+
+def seed(storage, history):
+    storage.create_user(dict(new_user('Bench User', BENCH_EMAIL, 'unused'), selected_sounds=['p', 'b']))
+    rng = random.Random(42)
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    for _ in range(history):
+        word = rng.choice(WORDS)
+        accuracy = round(rng.uniform(0, 100), 2)
+        storage.append_attempt(BENCH_EMAIL, {'total_score': 0}, {
+            'target_word': word, 'spoken_word': word, 'accuracy': accuracy, 'score': 0,
+            'timestamp': today - timedelta(days=rng.randint(0, 59))
+        })
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_backend(config, db, requests, history):
+    app = create_app(dict(config, TESTING=True, VOCABULARY_CHECK_MODEL=False, VAD_ENABLED=False,
+                          RECOGNITION_CACHE_BYTES=0), db=db,
+                     model_loader=lambda path: None, recognizer_factory=lambda model, rate: FakeRecognizer())
+    with app.app_context():
+        seed(app.extensions['spello'].storage, history)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_email'] = BENCH_EMAIL
+
+    def attempt():
+        # A fresh clip each time so the transcript cache can't answer
+        audio = os.urandom(3200)
+        return client.post('/attempt', data={'audio': (io.BytesIO(audio), 'a.wav')},
+                           content_type='multipart/form-data')
+
+    cases = {
+        'GET /get-target-word': lambda: client.get('/get-target-word'),
+        'POST /attempt': attempt,
+        'GET /dashboard': lambda: client.get('/dashboard'),
+    }
+    results = {}
+    for name, call in cases.items():
+        call()  # warm up
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = call()
+            samples.append(time.perf_counter() - started)
+            assert response.status_code == 200, (name, response.status_code, response.get_data())
+        results[name] = (statistics.median(samples), percentile(samples, 0.95))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare request latency on the MongoDB and SQLite backends.')
+    parser.add_argument('--mongo-uri', help='MongoDB server to use instead of mongomock (a spello_bench database is dropped)')
+    parser.add_argument('--requests', type=int, default=200, help='requests timed per route (default: 200)')
+    parser.add_argument('--history', type=int, default=1000, help='attempts seeded for the user (default: 1000)')
+    args = parser.parse_args(argv)
+
+    if args.mongo_uri:
+        import pymongo
+        db = pymongo.MongoClient(args.mongo_uri).get_database('spello_bench')
+        for name in ('sp1', 'score_history'):
+            db[name].drop()
+    else:
+        db = mongomock.MongoClient().db
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = {
+            'mongo': bench_backend({'STORAGE_BACKEND': 'mongo'}, db, args.requests, args.history),
+            'sqlite': bench_backend({'STORAGE_BACKEND': 'sqlite', 'SQLITE_PATH': os.path.join(directory, 'bench.db')},
+                                    None, args.requests, args.history),
+        }
+
+    print(f"{'route':22} {'backend':8} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    for route in results['mongo']:
+        for backend, rows in results.items():
+            p50, p95 = rows[route]
+            print(f"{route:22} {backend:8} {p50 * 1000:>10.2f} {p95 * 1000:>10.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
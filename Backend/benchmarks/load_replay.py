@@ -0,0 +1,369 @@
+"""
+Local load generator that replays a realistic session mix against the Flask app.
+
+Each virtual user logs in and then plays rounds of get-target-word,
+speech-to-text and play-game, polling the dashboard in between. Requests go
+through Flask test clients in-process, MongoDB is replaced by mongomock (or a
+local mongod with --mongo-uri) and the Vosk recognizer can be swapped for a
+fake one with a configurable real-time factor, so the whole run works offline.
+
+A response counts as an error when its status class differs from the one the
+step expects: the status recorded in the access log for profile sessions, a
+2xx otherwise. Errors are reported in total and split into 4xx and 5xx, so
+rejected requests (a 400 from play-game) show up next to server failures.
+A 503 with Retry-After is load shedding (recognition admission or the login
+queue turning work away) and is reported as shed rather than as an error.
+
+Session shapes can be recorded from access logs (werkzeug / common log format)
+into an anonymized profile and replayed later:
+
+    python benchmarks/load_replay.py record access.log -o profile.json
+    python benchmarks/load_replay.py run --profile profile.json --concurrency 1 4 16
+    python benchmarks/load_replay.py run --fake-recognizer --fake-rtf 0.2 --duration 20 --json load.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from io import BytesIO
+from datetime import datetime
+from collections import defaultdict
+
+import mongomock
+from werkzeug.security import generate_password_hash
+
+# Make app.py importable when the script is run from any directory
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from bench_asr import make_clip, write_wav  # noqa: E402
+
+ROUTES = ['/login', '/get-target-word', '/speech-to-text', '/play-game', '/dashboard']
+LOG_PATTERN = re.compile(
+    r'^(?P<client>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+) [^"]*" (?P<status>\d{3})'
+)
+LOG_TIME_FORMATS = ['%d/%b/%Y %H:%M:%S', '%d/%b/%Y:%H:%M:%S %z']
+SESSION_GAP_SECONDS = 30 * 60
+PASSWORD = 'load-test-password'
+
+# Used when no recorded profile is given: a login followed by a few game rounds
+DEFAULT_SESSIONS = [
+    {'requests': (
+        [{'method': 'POST', 'route': '/login', 'offset_ms': 0}] +
+        [step for round_no in range(5) for step in (
+            {'method': 'GET', 'route': '/get-target-word', 'offset_ms': 4000 * round_no + 300},
+            {'method': 'POST', 'route': '/speech-to-text', 'offset_ms': 4000 * round_no + 2300},
+            {'method': 'POST', 'route': '/play-game', 'offset_ms': 4000 * round_no + 2600},
+        )] +
+        [{'method': 'GET', 'route': '/dashboard', 'offset_ms': 21000}]
+    )},
+    {'requests': [
+        {'method': 'POST', 'route': '/login', 'offset_ms': 0},
+        {'method': 'GET', 'route': '/dashboard', 'offset_ms': 800},
+        {'method': 'GET', 'route': '/dashboard', 'offset_ms': 15000},
+    ]},
+]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Recording traffic shapes
+
+def parse_log_time(value):
+    for fmt in LOG_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def anonymize(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:12]
+
+
+def record_profile(lines):
+    """Turn access log lines into anonymized session shapes (routes and relative timing only)."""
+    requests_by_user = defaultdict(list)
+    for line in lines:
+        match = LOG_PATTERN.match(line.strip())
+        if not match:
+            continue
+        path, _, query = match.group('path').partition('?')
+        if path not in ROUTES:
+            continue
+        timestamp = parse_log_time(match.group('time'))
+        if timestamp is None:
+            continue
+        # Group by the email query parameter when present, otherwise by client address
+        email = re.search(r'(?:^|&)email=([^&]+)', query)
+        user_key = email.group(1) if email else match.group('client')
+        requests_by_user[anonymize(user_key)].append({
+            'method': match.group('method'),
+            'route': path,
+            'status': int(match.group('status')),
+            'time': timestamp
+        })
+
+    sessions = []
+    for user, entries in requests_by_user.items():
+        entries.sort(key=lambda entry: entry['time'])
+        current = []
+        for entry in entries:
+            if current and entry['time'] - current[-1]['time'] > SESSION_GAP_SECONDS:
+                sessions.append((user, current))
+                current = []
+            current.append(entry)
+        if current:
+            sessions.append((user, current))
+
+    return {
+        'recorded_at': datetime.now().strftime('%Y-%m-%d'),
+        'sessions': [{
+            'user': user,
+            'requests': [{
+                'method': entry['method'],
+                'route': entry['route'],
+                'status': entry['status'],
+                'offset_ms': int((entry['time'] - entries[0]['time']) * 1000)
+            } for entry in entries]
+        } for user, entries in sessions]
+    }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Replaying
+
+class FakeRecognizer:
+    """Stands in for vosk.KaldiRecognizer: sleeps for rtf * clip length and echoes a word."""
+
+    def __init__(self, rtf, sample_rate=16000):
+        self.rtf = rtf
+        self.sample_rate = sample_rate
+        # One fake is shared by all request threads, so keep the buffer per thread
+        self.local = threading.local()
+
+    def AcceptWaveform(self, data):
+        self.local.pending = getattr(self.local, 'pending', 0) + len(data)
+        return False
+
+    def Result(self):
+        time.sleep(self.rtf * getattr(self.local, 'pending', 0) / (2 * self.sample_rate))
+        self.local.pending = 0
+        return json.dumps({"text": random.choice(['pencil', 'paper', 'book', 'ball', 'table', 'dog'])})
+
+    FinalResult = Result
+
+
+def unexpected(status, expected=None):
+    # A recorded step expects the status class it got in the log, every other step a 2xx
+    return status // 100 != (expected or 200) // 100
+
+
+class RouteStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.client_errors = defaultdict(int)
+        self.server_errors = defaultdict(int)
+        self.shed = defaultdict(int)
+
+    def add(self, route, seconds, status, expected=None, shed=False):
+        with self.lock:
+            self.latencies[route].append(seconds)
+            if shed:
+                self.shed[route] += 1
+            elif unexpected(status, expected):
+                self.errors[route] += 1
+                if 400 <= status < 500:
+                    self.client_errors[route] += 1
+                elif status >= 500:
+                    self.server_errors[route] += 1
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def seed_users(collection, count, password_hash):
+    collection.insert_many([{
+        'email': f'load{i}@example.com',
+        'password': password_hash,
+        'name': f'Load User {i}',
+        'custom_words': [],
+        'selected_sounds': ['p', 'b'],
+        'total_score': 0,
+        'level': 1,
+        'attempts': 0,
+        'lives': 5,
+        'scores': [],
+        'current_streak': 0,
+        'max_streak': 0,
+        'last_practice_date': None
+    } for i in range(count)])
+
+
+def send(client, step, email, audio):
+    route = step['route']
+    if route == '/login':
+        return client.post('/login', json={'email': email, 'password': PASSWORD})
+    if route == '/speech-to-text':
+        # Vary the last samples so every attempt is a distinct upload for the transcript cache
+        upload = audio[:-4] + os.urandom(4)
+        return client.post('/speech-to-text', query_string={'email': email},
+                           data={'audio': (BytesIO(upload), 'attempt.wav')},
+                           content_type='multipart/form-data')
+    if step['method'] == 'POST':
+        return client.post(route, query_string={'email': email})
+    return client.get(route, query_string={'email': email})
+
+
+def virtual_user(app, worker_id, sessions, audio, stats, stop_at, speed):
+    email = f'load{worker_id}@example.com'
+    rng = random.Random(worker_id)
+    client = app.test_client()
+    while time.perf_counter() < stop_at:
+        session_shape = rng.choice(sessions)
+        started = time.perf_counter()
+        for step in session_shape['requests']:
+            if speed:
+                # Honour the recorded think time between requests, scaled by speed
+                wait = started + step['offset_ms'] / 1000 / speed - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            if time.perf_counter() >= stop_at:
+                return
+            t0 = time.perf_counter()
+            shed = False
+            try:
+                response = send(client, step, email, audio)
+                status = response.status_code
+                shed = status == 503 and 'Retry-After' in response.headers
+            except Exception:
+                status = 599
+            stats.add(step['route'], time.perf_counter() - t0, status, step.get('status'), shed)
+
+
+def run_level(app, concurrency, sessions, audio, duration, speed):
+    stats = RouteStats()
+    stop_at = time.perf_counter() + duration
+    workers = [threading.Thread(target=virtual_user,
+                                args=(app, worker_id, sessions, audio, stats, stop_at, speed))
+               for worker_id in range(concurrency)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+
+    report = {}
+    for route, latencies in sorted(stats.latencies.items()):
+        report[route] = {
+            'requests': len(latencies),
+            'throughput_rps': len(latencies) / wall,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'error_rate': stats.errors[route] / len(latencies),
+            'client_error_rate': stats.client_errors[route] / len(latencies),
+            'server_error_rate': stats.server_errors[route] / len(latencies),
+            'shed_rate': stats.shed[route] / len(latencies)
+        }
+    return report
+
+
+def run(args):
+    if args.profile:
+        with open(args.profile, 'r') as f:
+            sessions = json.load(f)['sessions']
+    else:
+        sessions = DEFAULT_SESSIONS
+    sessions = [session for session in sessions if session['requests']]
+
+    from app import create_app
+
+    if args.mongo_uri:
+        import pymongo
+        db = pymongo.MongoClient(args.mongo_uri).get_database('spello_load')
+        db.sp1.drop()
+        db.score_history.drop()
+    else:
+        db = mongomock.MongoClient().db
+    collection = db.sp1
+    seed_users(collection, max(args.concurrency), generate_password_hash(PASSWORD))
+
+    clip = BytesIO()
+    write_wav(clip, make_clip(args.clip_seconds, 0.4, 16000), 16000)
+    audio = clip.getvalue()
+
+    options = {}
+    if args.fake_recognizer:
+        fake = FakeRecognizer(args.fake_rtf)
+        options = {'model_loader': lambda path: None, 'recognizer_factory': lambda model, sample_rate: fake}
+    app = create_app({'TESTING': True, 'VOCABULARY_CHECK_MODEL': not args.fake_recognizer}, db=db, **options)
+
+    results = {}
+    for concurrency in args.concurrency:
+        report = run_level(app, concurrency, sessions, audio, args.duration, args.speed)
+        results[concurrency] = report
+        print(f"\nconcurrency={concurrency}")
+        print(f"{'route':20} {'requests':>9} {'req/s':>8} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} "
+              f"{'errors':>7} {'4xx':>7} {'5xx':>7} {'shed':>7}")
+        for route, row in report.items():
+            print(f"{route:20} {row['requests']:>9} {row['throughput_rps']:>8.1f} {row['p50_ms']:>9.1f} "
+                  f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['error_rate'] * 100:>6.1f}% "
+                  f"{row['client_error_rate'] * 100:>6.1f}% {row['server_error_rate'] * 100:>6.1f}% "
+                  f"{row['shed_rate'] * 100:>6.1f}%")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'duration': args.duration, 'speed': args.speed, 'levels': results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a realistic session mix against the Flask app.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help='build an anonymized traffic profile from access logs')
+    record.add_argument('logs', nargs='+', help='access log files')
+    record.add_argument('-o', '--output', default='profile.json', help='profile file to write')
+
+    replay = commands.add_parser('run', help='replay sessions at increasing concurrency')
+    replay.add_argument('--profile', help='recorded profile (default: built-in session mix)')
+    replay.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help='virtual users per level')
+    replay.add_argument('--duration', type=float, default=10, help='seconds per concurrency level')
+    replay.add_argument('--speed', type=float, default=0,
+                        help='think time multiplier: 1 replays recorded gaps, 0 sends back to back (default)')
+    replay.add_argument('--fake-recognizer', action='store_true', help='replace Vosk with a fake recognizer')
+    replay.add_argument('--fake-rtf', type=float, default=0.1, help='real-time factor of the fake recognizer')
+    replay.add_argument('--clip-seconds', type=float, default=2, help='length of the uploaded audio clip')
+    replay.add_argument('--mongo-uri', help='use a local MongoDB instead of mongomock')
+    replay.add_argument('--json', metavar='FILE', help='write the results as JSON')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        lines = []
+        for path in args.logs:
+            with open(path, 'r', errors='replace') as f:
+                lines.extend(f)
+        profile = record_profile(lines)
+        with open(args.output, 'w') as f:
+            json.dump(profile, f, indent=2)
+        print(f"Recorded {len(profile['sessions'])} sessions to {args.output}")
+        return 0
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Compact old attempt records out of the user documents.
+
+Attempts older than the horizon are written to a compressed NDJSON archive
+per user (zstd when the zstandard package is installed, gzip otherwise),
+rolled into the per-day score_history buckets and removed from the scores
+array. Totals and the best accuracy per word are kept on the user as
+`archived_summary`, so averages and words mastered stay exact.
+
+Archives can be put back into the scores array with the restore command.
+
+Usage:
+    MONGO_URI="mongodb+srv://..." python compact_history.py compact --horizon-days 180
+    python compact_history.py compact --horizon-days 90 --email student@example.com --dry-run
+    python compact_history.py restore --email student@example.com
+"""
+
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import argparse
+from datetime import datetime, timedelta
+
+import bson
+from pymongo import MongoClient, UpdateOne
+
+from history import DATE_FORMAT, as_day, buckets_from_scores, ensure_history_indexes
+
+try:
+    import zstandard
+except ImportError:  # gzip archives only
+    zstandard = None
+
+DEFAULT_ARCHIVE_DIR = os.environ.get('HISTORY_ARCHIVE_DIR', 'history_archive')
+DEFAULT_HORIZON_DAYS = 180
+
+
+def user_archive_dir(archive_dir, email):
+    return os.path.join(archive_dir, re.sub(r'[^\w.@+-]', '_', email))
+
+
+def archive_paths(archive_dir, email):
+    # A user's archive files not yet put back by restore, oldest first
+    paths = sorted(glob.glob(os.path.join(user_archive_dir(archive_dir, email), '*.ndjson.*')))
+    return [path for path in paths if not path.endswith('.restored')]
+
+
+def archive_default(value):
+    # Timestamps are written as ISO dates and turned back into datetimes on restore
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def write_archive(archive_dir, email, scores):
+    # One file per user per run, written and synced before anything is removed from the database
+    directory = user_archive_dir(archive_dir, email)
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    data = ''.join(json.dumps(score, default=archive_default) + '\n' for score in scores).encode('utf-8')
+
+    if zstandard is not None:
+        path = os.path.join(directory, stamp + '.ndjson.zst')
+        payload = zstandard.ZstdCompressor(level=10).compress(data)
+    else:
+        path = os.path.join(directory, stamp + '.ndjson.gz')
+        payload = gzip.compress(data)
+
+    with open(path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    return path, len(data), len(payload)
+
+
+def read_archive(path):
+    with open(path, 'rb') as f:
+        payload = f.read()
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+    else:
+        data = gzip.decompress(payload)
+    return [json.loads(line) for line in data.decode('utf-8').splitlines() if line]
+
+
+def summarize(scores, summary=None):
+    # Fold attempts into the archived summary (totals plus best accuracy per word)
+    summary = dict(summary or {})
+    best_accuracy = dict(summary.get('best_accuracy', {}))
+    summary['attempts'] = summary.get('attempts', 0) + len(scores)
+    summary['accuracy_sum'] = summary.get('accuracy_sum', 0) + sum(score.get('accuracy', 0) for score in scores)
+    summary['score_sum'] = summary.get('score_sum', 0) + sum(score.get('score', 0) for score in scores)
+    for score in scores:
+        word = score.get('target_word')
+        if word:
+            best_accuracy[word] = max(best_accuracy.get(word, 0), score.get('accuracy', 0))
+    summary['best_accuracy'] = best_accuracy
+    return summary
+
+
+def compact(users, history, archive_dir, horizon, email=None, dry_run=False):
+    """
+    Move attempts dated before `horizon` (a date) out of the user documents.
+
+    Returns a report with the users compacted, attempts archived, document
+    bytes reclaimed and archive bytes written.
+    """
+    horizon_day = as_day(horizon)
+    # Attempts not yet migrated to native dates still carry a date string
+    old_attempt = {"$or": [{"timestamp": {"$lt": horizon_day}},
+                           {"timestamp": {"$type": "string", "$lt": horizon.strftime(DATE_FORMAT)}}]}
+    report = {"horizon": horizon.strftime(DATE_FORMAT), "users": 0, "attempts": 0, "document_bytes_before": 0,
+              "document_bytes_after": 0, "archive_raw_bytes": 0, "archive_bytes": 0, "archives": []}
+    if not dry_run:
+        ensure_history_indexes(history)
+
+    query = {"scores": {"$elemMatch": old_attempt}}
+    if email:
+        query["email"] = email
+
+    for user in users.find(query, {"email": 1, "scores": 1, "archived_summary": 1}).batch_size(50):
+        scores = user.get("scores", [])
+        old, kept = [], []
+        for score in scores:
+            day = as_day(score.get('timestamp'))
+            (old if day is not None and day < horizon_day else kept).append(score)
+        if not old:
+            continue
+
+        summary = summarize(old, user.get("archived_summary"))
+        report["users"] += 1
+        report["attempts"] += len(old)
+        report["document_bytes_before"] += len(bson.encode(user))
+        report["document_bytes_after"] += len(bson.encode(dict(user, scores=kept, archived_summary=summary)))
+        if dry_run:
+            continue
+
+        path, raw_bytes, archive_bytes = write_archive(archive_dir, user["email"], old)
+        report["archive_raw_bytes"] += raw_bytes
+        report["archive_bytes"] += archive_bytes
+        report["archives"].append(path)
+
+        # Compacted days are complete, so their buckets can be set exactly
+        buckets = buckets_from_scores(user["email"], old)
+        if buckets:
+            history.bulk_write([UpdateOne({"email": bucket["email"], "day": bucket["day"]}, {"$set": bucket}, upsert=True)
+                                for bucket in buckets], ordered=False)
+
+        # Only the archived days are pulled, so attempts pushed by play_game meanwhile are kept
+        old_timestamps = list({score['timestamp'] for score in old})
+        users.update_one(
+            {"_id": user["_id"]},
+            {"$pull": {"scores": {"timestamp": {"$in": old_timestamps}}}, "$set": {"archived_summary": summary}}
+        )
+
+    report["bytes_reclaimed"] = report["document_bytes_before"] - report["document_bytes_after"]
+    return report
+
+
+def restore(users, archive_dir, email):
+    """Put every archived attempt for a user back into their scores array."""
+    paths = archive_paths(archive_dir, email)
+    if not paths:
+        return 0
+
+    restored = []
+    for path in paths:
+        restored.extend(read_archive(path))
+    for score in restored:
+        score['timestamp'] = as_day(score.get('timestamp'))
+    restored.sort(key=lambda score: score['timestamp'] or datetime.min)
+
+    # Archived attempts are older than anything left in the document, so they go first
+    result = users.update_one(
+        {"email": email},
+        {"$push": {"scores": {"$each": restored, "$position": 0}}, "$unset": {"archived_summary": ""}}
+    )
+    if not result.matched_count:
+        raise LookupError(f"User {email} not found")
+
+    for path in paths:
+        os.rename(path, path + '.restored')
+    return len(restored)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archive and compact old attempt records.')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI'), help='MongoDB connection string')
+    parser.add_argument('--archive-dir', default=DEFAULT_ARCHIVE_DIR, help='directory for archive files')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compact_parser = commands.add_parser('compact', help='archive attempts older than the horizon')
+    compact_parser.add_argument('--horizon-days', type=int, default=DEFAULT_HORIZON_DAYS,
+                                help=f'keep attempts from the last N days (default: {DEFAULT_HORIZON_DAYS})')
+    compact_parser.add_argument('--email', help='only compact this user')
+    compact_parser.add_argument('--dry-run', action='store_true', help='report without writing anything')
+    compact_parser.add_argument('--json', action='store_true', help='print the report as JSON')
+
+    restore_parser = commands.add_parser('restore', help='restore archived attempts for a user')
+    restore_parser.add_argument('--email', required=True, help='user to restore')
+
+    args = parser.parse_args(argv)
+    if not args.mongo_uri:
+        parser.error("--mongo-uri or MONGO_URI is required")
+
+    db = MongoClient(args.mongo_uri).get_default_database('spello_database')
+
+    if args.command == 'restore':
+        count = restore(db.sp1, args.archive_dir, args.email)
+        print(f"Restored {count} attempts for {args.email}")
+        return 0
+
+    horizon = datetime.now().date() - timedelta(days=args.horizon_days)
+    report = compact(db.sp1, db.score_history, args.archive_dir, horizon, args.email, args.dry_run)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"{'Would compact' if args.dry_run else 'Compacted'} {report['attempts']} attempts "
+          f"before {report['horizon']} for {report['users']} users")
+    print(f"Document bytes: {report['document_bytes_before']} -> {report['document_bytes_after']} "
+          f"({report['bytes_reclaimed']} reclaimed)")
+    if not args.dry_run:
+        print(f"Archive bytes: {report['archive_bytes']} ({report['archive_raw_bytes']} uncompressed) "
+              f"in {len(report['archives'])} files")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Response compression and per-route payload stats.
+
+Responses at or above `min_size` bytes are compressed with brotli (when
+the brotli package is installed) or gzip, whichever the client prefers in
+Accept-Encoding. Streamed responses (exports) are left alone.
+"""
+
+import gzip
+import time
+import threading
+
+from flask import g, request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'application/json', 'application/x-ndjson', 'text/csv', 'text/html', 'text/plain'}
+
+
+def parse_accept_encoding(header):
+    # {coding: q} from e.g. "gzip;q=0.8, br"
+    codings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+def choose_encoding(header):
+    codings = parse_accept_encoding(header or '')
+    available = (['br'] if brotli is not None else []) + ['gzip']
+    wildcard = codings.get('*', 0.0)
+    # Highest q wins; on a tie the order above (brotli first) decides
+    best = max(available, key=lambda coding: codings.get(coding, wildcard))
+    return best if codings.get(best, wildcard) > 0 else None
+
+
+class ResponseStats:
+    """Payload size, encode and compression time per route (Flask endpoint)."""
+
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, raw_bytes, sent_bytes, encode_seconds, compress_seconds, encoding):
+        with self.lock:
+            route = self.routes.setdefault(endpoint, {
+                "responses": 0, "compressed": 0, "raw_bytes": 0, "sent_bytes": 0,
+                "encode_seconds": 0.0, "compress_seconds": 0.0, "max_raw_bytes": 0
+            })
+            route["responses"] += 1
+            route["compressed"] += 1 if encoding else 0
+            route["raw_bytes"] += raw_bytes
+            route["sent_bytes"] += sent_bytes
+            route["encode_seconds"] += encode_seconds
+            route["compress_seconds"] += compress_seconds
+            route["max_raw_bytes"] = max(route["max_raw_bytes"], raw_bytes)
+
+    def stats(self):
+        with self.lock:
+            return {
+                endpoint: {
+                    "responses": route["responses"],
+                    "compressed": route["compressed"],
+                    "avg_raw_bytes": round(route["raw_bytes"] / route["responses"]),
+                    "avg_sent_bytes": round(route["sent_bytes"] / route["responses"]),
+                    "max_raw_bytes": route["max_raw_bytes"],
+                    "avg_encode_ms": round(route["encode_seconds"] / route["responses"] * 1000, 3),
+                    "avg_compress_ms": round(route["compress_seconds"] / route["responses"] * 1000, 3)
+                }
+                for endpoint, route in self.routes.items()
+            }
+
+
+def init_compression(app, stats, min_size=1024, gzip_level=6, brotli_quality=5):
+    @app.after_request
+    def compress_response(response):
+        if response.direct_passthrough or response.is_streamed:
+            return response
+
+        data = response.get_data()
+        encoding = None
+        compress_seconds = 0.0
+        if response.mimetype in COMPRESSIBLE_TYPES and 200 <= response.status_code < 300:
+            response.vary.add('Accept-Encoding')
+            if len(data) >= min_size and 'Content-Encoding' not in response.headers:
+                encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+
+        if encoding:
+            started = time.perf_counter()
+            if encoding == 'br':
+                body = brotli.compress(data, quality=brotli_quality)
+            else:
+                body = gzip.compress(data, compresslevel=gzip_level, mtime=0)
+            compress_seconds = time.perf_counter() - started
+            response.set_data(body)
+            response.headers['Content-Encoding'] = encoding
+
+        # Route name without the blueprint prefix (spello.get_user -> get_user)
+        endpoint = request.endpoint.rpartition('.')[2] if request.endpoint else 'unmatched'
+        stats.record(endpoint, len(data), response.content_length or 0,
+                     g.get('json_encode_seconds', 0.0), compress_seconds, encoding)
+        return response
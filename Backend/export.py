@@ -0,0 +1,267 @@
+"""
+Stream attempt history for a user or a cohort (group) as NDJSON, CSV or Parquet.
+
+Rows come straight off a MongoDB aggregation cursor ($unwind over the
+scores array), so only one cursor batch per user is held in memory at a
+time. Cohort exports read each user's cursor on a small thread pool and
+hand rows over through a bounded queue.
+
+Attempts that compact_history.py moved out of the user documents are read
+back from the history archive (--archive-dir / HISTORY_ARCHIVE_DIR) and
+exported ahead of the live ones. Without access to that directory an export
+only holds the attempts still in the documents.
+
+Usage:
+    MONGO_URI="mongodb+srv://..." python export.py --email student@example.com --format csv -o student.csv
+    python export.py --group class-4b --format parquet -o class-4b.parquet
+    python export.py --email student@example.com --archive-dir /srv/spello/history_archive
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import queue
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import MongoClient
+
+from compact_history import DEFAULT_ARCHIVE_DIR, archive_paths, read_archive
+from history import DATE_FORMAT, as_day
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export disabled
+    pyarrow = None
+
+EXPORT_FIELDS = ['email', 'name', 'group', 'target_word', 'spoken_word', 'accuracy', 'score', 'timestamp']
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+CURSOR_BATCH_SIZE = 500
+PARQUET_ROW_GROUP = 5000
+DEFAULT_WORKERS = 4
+
+
+def export_pipeline(email):
+    return [
+        {"$match": {"email": email}},
+        {"$unwind": "$scores"},
+        {"$project": {
+            "_id": 0, "email": 1, "name": 1, "group": 1,
+            "target_word": "$scores.target_word",
+            "spoken_word": "$scores.spoken_word",
+            "accuracy": "$scores.accuracy",
+            "score": "$scores.score",
+            "timestamp": "$scores.timestamp"
+        }}
+    ]
+
+
+def archived_timestamp(value):
+    # Archives hold ISO timestamps, or day strings for attempts archived before the date migration
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return as_day(value)
+
+
+def iter_archived_attempts(archive_dir, user):
+    """Rows for the attempts compacted out of a user's document, oldest archive first."""
+    for path in archive_paths(archive_dir, user['email']):
+        for score in read_archive(path):
+            row = dict(score, email=user['email'], name=user.get('name'), group=user.get('group'),
+                       timestamp=archived_timestamp(score.get('timestamp')))
+            yield {field: row.get(field) for field in EXPORT_FIELDS}
+
+
+def iter_user_attempts(collection, email, archive_dir=None):
+    if archive_dir:
+        # Archived attempts are older than anything left in the document, so they come first
+        user = collection.find_one({"email": email}, {"_id": 0, "name": 1, "group": 1})
+        if user:
+            yield from iter_archived_attempts(archive_dir, dict(user, email=email))
+    for row in collection.aggregate(export_pipeline(email), batchSize=CURSOR_BATCH_SIZE):
+        yield {field: row.get(field) for field in EXPORT_FIELDS}
+
+
+def iter_cohort_attempts(collection, group, workers=DEFAULT_WORKERS, archive_dir=None):
+    """
+    Rows for every user in a group, read in parallel, one user per task.
+
+    Rows from different users are interleaved in batches; each row carries
+    the user's email. The queue is bounded so a slow consumer holds back
+    the readers instead of buffering the cohort.
+    """
+    emails = [user["email"] for user in collection.find({"group": group}, {"_id": 0, "email": 1})]
+    rows = queue.Queue(maxsize=workers * 2)
+    done = object()
+    stop = threading.Event()
+
+    def read_user(email):
+        batch = []
+        for row in iter_user_attempts(collection, email, archive_dir):
+            batch.append(row)
+            if len(batch) >= CURSOR_BATCH_SIZE:
+                if not put(batch):
+                    return
+                batch = []
+        if batch:
+            put(batch)
+
+    def put(batch):
+        # Give up if the consumer has gone away (closed download)
+        while not stop.is_set():
+            try:
+                rows.put(batch, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        result = done
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in [executor.submit(read_user, email) for email in emails]:
+                    future.result()
+        except Exception as e:  # handed to the consumer so a failed export doesn't look complete
+            result = e
+        put(result)
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            batch = rows.get()
+            if batch is done:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield from batch
+    finally:
+        stop.set()
+
+
+def text_value(value):
+    # Practice days are written as plain dates in the text formats
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT) if value == as_day(value) else value.isoformat()
+    return value
+
+
+def to_ndjson(rows):
+    for row in rows:
+        yield json.dumps({field: text_value(value) for field, value in row.items()}, default=str) + '\n'
+
+
+def to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({field: text_value(value) for field, value in row.items()})
+        # Hand each line on as soon as it is written
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file that lets the Parquet writer's output be drained between row groups
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def to_parquet(rows, row_group=PARQUET_ROW_GROUP):
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is required for Parquet exports")
+    schema = pyarrow.schema([
+        ('email', pyarrow.string()), ('name', pyarrow.string()), ('group', pyarrow.string()),
+        ('target_word', pyarrow.string()), ('spoken_word', pyarrow.string()),
+        ('accuracy', pyarrow.float64()), ('score', pyarrow.float64()), ('timestamp', pyarrow.timestamp('ms'))
+    ])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+
+    def flush(batch):
+        columns = {field: [row[field] for row in batch] for field in EXPORT_FIELDS}
+        columns['timestamp'] = [as_day(value) for value in columns['timestamp']]
+        writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+        return sink.drain()
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= row_group:
+            yield flush(batch)
+            batch = []
+    if batch:
+        yield flush(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def encode(rows, export_format):
+    if export_format == 'ndjson':
+        return to_ndjson(rows)
+    if export_format == 'csv':
+        return to_csv(rows)
+    return to_parquet(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export attempt history for a user or cohort.')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI'), help='MongoDB connection string')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--email', help='export one user')
+    target.add_argument('--group', help='export every user in a cohort (group)')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson', help='output format')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='parallel users for cohort exports')
+    parser.add_argument('--archive-dir', default=DEFAULT_ARCHIVE_DIR,
+                        help='history archive written by compact_history.py (default: HISTORY_ARCHIVE_DIR)')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    if not args.mongo_uri:
+        parser.error("--mongo-uri or MONGO_URI is required")
+    if args.format == 'parquet' and pyarrow is None:
+        parser.error("pyarrow is required for Parquet exports")
+
+    collection = MongoClient(args.mongo_uri).get_default_database('spello_database').sp1
+    if args.email:
+        rows = iter_user_attempts(collection, args.email, args.archive_dir)
+    else:
+        rows = iter_cohort_attempts(collection, args.group, args.workers, args.archive_dir)
+
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in encode(rows, args.format):
+            output.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    finally:
+        if args.output:
+            output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Per-user, per-day score history buckets with pre-summed stats.
+
+Every attempt increments the bucket for its day, so trend queries over any
+range read one small document per day instead of the user's whole history.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+# Dates are stored as BSON datetimes at midnight; this is only the format used in API responses
+DATE_FORMAT = '%Y-%m-%d'
+
+# Named ranges accepted by the trend endpoint, in days (today included)
+TREND_RANGES = {"week": 7, "month": 30, "term": 120}
+# Limits on custom trend ranges: the span in days, and the points returned at the chosen granularity
+MAX_TREND_DAYS = 3660
+MAX_TREND_POINTS = 366
+
+
+def as_day(value):
+    """
+    Midnight datetime for a stored day, or None.
+
+    Accepts the native form as well as the 'YYYY-MM-DD' strings written
+    before timestamps were migrated, so reads work during the migration.
+    """
+    if isinstance(value, datetime):
+        return datetime.combine(value.date(), time.min)
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return None
+
+
+def ensure_history_indexes(history):
+    history.create_index([("email", 1), ("day", 1)], unique=True)
+
+
+# Add one attempt to the user's bucket for that day, creating the bucket if needed
+def record_attempt(history, email, day, accuracy, score):
+    history.update_one(
+        {"email": email, "day": as_day(day)},
+        {
+            "$inc": {"attempts": 1, "accuracy_sum": accuracy, "score_sum": score},
+            "$max": {"best_accuracy": accuracy}
+        },
+        upsert=True
+    )
+
+
+# Build the buckets for a list of score entries (used to backfill existing users)
+def buckets_from_scores(email, scores):
+    buckets = {}
+    for score in scores:
+        day = as_day(score.get('timestamp'))
+        if day is None:
+            continue
+        bucket = buckets.setdefault(day, {
+            "email": email, "day": day, "attempts": 0, "accuracy_sum": 0, "score_sum": 0, "best_accuracy": 0
+        })
+        accuracy = score.get('accuracy', 0)
+        bucket["attempts"] += 1
+        bucket["accuracy_sum"] += accuracy
+        bucket["score_sum"] += score.get('score', 0)
+        bucket["best_accuracy"] = max(bucket["best_accuracy"], accuracy)
+    return list(buckets.values())
+
+
+def pick_granularity(days):
+    # Keep long ranges to a readable number of points
+    if days <= 31:
+        return "day"
+    if days <= 190:
+        return "week"
+    return "month"
+
+
+def period_start(day, granularity):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def count_periods(start, end, granularity):
+    # Number of trend points between two dates (inclusive)
+    if granularity == "week":
+        return (period_start(end, granularity) - period_start(start, granularity)).days // 7 + 1
+    if granularity == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+
+def next_period(start, granularity):
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def read_trend(history, email, start, end, granularity=None):
+    """
+    Accuracy trend between two dates (inclusive), one point per day, week or month.
+
+    Only the buckets inside the range are read, via the (email, day) index.
+    Buckets still keyed by a date string (not yet migrated) are included.
+    """
+    cursor = history.find(
+        {"email": email, "$or": [
+            {"day": {"$gte": as_day(start), "$lte": as_day(end)}},
+            {"day": {"$gte": start.strftime(DATE_FORMAT), "$lte": end.strftime(DATE_FORMAT)}}
+        ]},
+        {"_id": 0, "day": 1, "attempts": 1, "accuracy_sum": 1}
+    )
+    buckets = ((bucket["day"], bucket.get("attempts", 0), bucket.get("accuracy_sum", 0)) for bucket in cursor)
+    return build_trend(buckets, start, end, granularity)
+
+
+def build_trend(buckets, start, end, granularity=None):
+    """The trend response from (day, attempts, accuracy_sum) buckets inside the range."""
+    granularity = granularity or pick_granularity((end - start).days + 1)
+
+    totals = {}
+    for day, bucket_attempts, bucket_accuracy_sum in buckets:
+        day = as_day(day)
+        if day is None:
+            continue
+        key = period_start(day.date(), granularity)
+        attempts, accuracy_sum = totals.get(key, (0, 0))
+        totals[key] = (attempts + bucket_attempts, accuracy_sum + bucket_accuracy_sum)
+
+    trend = []
+    current = period_start(start, granularity)
+    while current <= end:
+        attempts, accuracy_sum = totals.get(current, (0, 0))
+        point = {
+            "date": max(current, start).strftime(DATE_FORMAT),
+            "average_accuracy": round(accuracy_sum / attempts, 2) if attempts else 0,
+            "attempts": attempts
+        }
+        if granularity != "day":
+            point["end_date"] = min(next_period(current, granularity) - timedelta(days=1), end).strftime(DATE_FORMAT)
+        trend.append(point)
+        current = next_period(current, granularity)
+    return {"granularity": granularity, "trend": trend}
+
+
+def read_attempts(users, email, limit=20, before=None):
+    """
+    A page of the user's attempts, newest first, or None if there is no such user.
+
+    Attempt ids are positions in the user's full history (compacted attempts
+    included), so they stay put as attempts are added. `before` is the id to
+    page back from. Only the page is read from the scores array, via $slice,
+    after a $size lookup for its length.
+    """
+    sizes = list(users.aggregate([
+        {"$match": {"email": email}},
+        {"$limit": 1},
+        {"$project": {"_id": 0, "size": {"$size": {"$ifNull": ["$scores", []]}},
+                      "archived": {"$ifNull": ["$archived_summary.attempts", 0]}}}
+    ]))
+    if not sizes:
+        return None
+    size, archived = sizes[0]["size"], sizes[0]["archived"]
+
+    # Page over positions [start, end) of the live scores array
+    end = size if before is None else max(0, min(size, before - archived))
+    start = max(0, end - limit)
+    attempts = []
+    if end > start:
+        user = users.find_one({"email": email}, {"_id": 0, "scores": {"$slice": [start, end - start]}})
+        for offset, attempt in enumerate(user.get("scores", [])):
+            attempts.append(dict(attempt, id=archived + start + offset))
+        attempts.reverse()
+
+    return {
+        "attempts": attempts,
+        "next_before": archived + start if start > 0 else None,
+        "total_attempts": archived + size,
+        "archived_attempts": archived
+    }
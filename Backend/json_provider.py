@@ -0,0 +1,102 @@
+"""
+JSON encoding for API responses.
+
+orjson is used when it is installed, otherwise the standard library (set
+JSON_ENCODER=json to force it). Both write ObjectIds as strings and stored
+dates (midnight BSON datetimes) as YYYY-MM-DD, so routes can return
+documents straight from MongoDB. Encode time is added up per request for
+the response stats. Flask 2.2+ gets a JSON provider; older Flask an encoder
+class that does the same.
+"""
+
+import json
+import time
+from datetime import date, datetime
+
+from bson import ObjectId
+from flask import g, has_request_context, json as flask_json
+
+from history import DATE_FORMAT, as_day
+
+try:
+    import orjson
+except ImportError:  # standard library encoder only
+    orjson = None
+
+ENCODERS = ('orjson', 'json')
+
+
+def format_datetime(value):
+    return value.strftime(DATE_FORMAT) if value == as_day(value) else value.isoformat()
+
+
+def default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj, encoder='orjson', indent=None):
+    if encoder == 'orjson' and orjson is not None:
+        # Dates are passed through to default() so they keep the YYYY-MM-DD format
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+    return json.dumps(obj, default=default, indent=indent, separators=(',', ':') if indent is None else None)
+
+
+def record_encode_time(seconds):
+    if has_request_context():
+        g.json_encode_seconds = g.get('json_encode_seconds', 0) + seconds
+
+
+if hasattr(flask_json, 'provider'):
+    class SpelloJSONProvider(flask_json.provider.DefaultJSONProvider):
+        encoder = 'orjson'
+
+        def dumps(self, obj, **kwargs):
+            started = time.perf_counter()
+            try:
+                return dumps(obj, self.encoder, kwargs.get('indent'))
+            finally:
+                record_encode_time(time.perf_counter() - started)
+
+        def loads(self, s, **kwargs):
+            if self.encoder == 'orjson' and orjson is not None:
+                return orjson.loads(s)
+            return json.loads(s, **kwargs)
+
+
+class SpelloJSONEncoder(json.JSONEncoder):
+    """
+    Encoder class for Flask < 2.2 (the version in requirements.txt), which
+    has no provider. encode() hands the whole document to dumps(), so it
+    still goes through orjson and is timed like the provider.
+    """
+    encoder = 'orjson'
+
+    def default(self, value):
+        return default(value)
+
+    def encode(self, obj):
+        started = time.perf_counter()
+        try:
+            return dumps(obj, self.encoder, self.indent)
+        finally:
+            record_encode_time(time.perf_counter() - started)
+
+
+def init_json(app, encoder='orjson'):
+    if encoder not in ENCODERS:
+        raise ValueError(f"JSON_ENCODER must be one of: {', '.join(ENCODERS)}")
+    if hasattr(flask_json, 'provider'):
+        provider = SpelloJSONProvider(app)
+        provider.encoder = encoder
+        app.json = provider
+    else:
+        app.json_encoder = type('SpelloJSONEncoder', (SpelloJSONEncoder,), {'encoder': encoder})
@@ -0,0 +1,75 @@
+"""
+Cached top-k leaderboards on total_score, globally and per group (classroom).
+"""
+
+import time
+import threading
+
+# Fields needed to render a leaderboard row
+LEADERBOARD_PROJECTION = {"_id": 0, "email": 1, "name": 1, "group": 1, "total_score": 1, "level": 1}
+LEADERBOARD_SORT = [("total_score", -1), ("email", 1)]
+
+
+# Indexes that let the top-k and rank queries walk total_score in order instead of scanning users
+def ensure_leaderboard_indexes(collection):
+    collection.create_index([("total_score", -1)])
+    collection.create_index([("group", 1), ("total_score", -1)])
+
+
+class LeaderboardCache:
+    """
+    Keeps the top `size` users per scope (None for global, or a group name).
+
+    Boards are loaded from the total_score index on first use, updated in place
+    when play_game changes a score, and reloaded after `ttl` seconds so scores
+    written by other workers show up too.
+    """
+
+    def __init__(self, size=50, ttl=30):
+        self.size = size
+        self.ttl = ttl
+        self.boards = {}
+        self.lock = threading.Lock()
+
+    def top(self, collection, group=None, limit=None):
+        with self.lock:
+            board = self.boards.get(group)
+            if board is None or time.monotonic() - board[0] > self.ttl:
+                query = {"group": group} if group else {}
+                entries = list(collection.find(query, LEADERBOARD_PROJECTION).sort(LEADERBOARD_SORT).limit(self.size))
+                board = self.boards[group] = (time.monotonic(), entries)
+            return [dict(entry) for entry in board[1][:limit or self.size]]
+
+    def record_score(self, user, total_score, level):
+        entry = {
+            "email": user.get("email"),
+            "name": user.get("name", ""),
+            "group": user.get("group"),
+            "total_score": total_score,
+            "level": level
+        }
+        scopes = [None] + ([user["group"]] if user.get("group") else [])
+        with self.lock:
+            for scope in scopes:
+                # Boards that aren't loaded yet will pick the new score up from the database
+                if scope not in self.boards:
+                    continue
+                loaded_at, entries = self.boards[scope]
+                entries = [row for row in entries if row["email"] != entry["email"]]
+                if len(entries) < self.size or total_score > entries[-1]["total_score"]:
+                    entries.append(dict(entry))
+                    entries.sort(key=lambda row: (-row["total_score"], row["email"]))
+                    del entries[self.size:]
+                self.boards[scope] = (loaded_at, entries)
+
+    def invalidate(self):
+        with self.lock:
+            self.boards.clear()
+
+
+# 1-based rank from a count over the total_score index; users with equal scores share a rank
+def get_rank(collection, total_score, group=None):
+    query = {"total_score": {"$gt": total_score}}
+    if group:
+        query["group"] = group
+    return collection.count_documents(query) + 1
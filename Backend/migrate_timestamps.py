@@ -0,0 +1,101 @@
+"""
+Convert 'YYYY-MM-DD' string dates to native BSON dates.
+
+Rewrites scores[].timestamp and last_practice_date on user documents and the
+day key of the score_history buckets. It can run while the app is serving:
+readers accept both forms, a user document is only rewritten if no attempt
+was added or removed since it was read (otherwise it is re-read and
+retried), and a string bucket whose day already has a native bucket is
+folded into it.
+
+Usage:
+    MONGO_URI="mongodb+srv://..." python migrate_timestamps.py
+    python migrate_timestamps.py --mongo-uri mongodb://localhost:27017/spello_database
+"""
+
+import os
+import sys
+import argparse
+
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
+
+from history import as_day, ensure_history_indexes
+
+MAX_RETRIES = 5
+USER_PROJECTION = {"scores": 1, "last_practice_date": 1}
+
+
+def convert(value):
+    # Unparseable strings are left alone rather than lost
+    return (as_day(value) or value) if isinstance(value, str) and value else value
+
+
+def migrate_users(users):
+    migrated = 0
+    skipped = 0
+    query = {"$or": [{"scores.timestamp": {"$type": "string"}}, {"last_practice_date": {"$type": "string"}}]}
+    for user in users.find(query, USER_PROJECTION).batch_size(100):
+        for _ in range(MAX_RETRIES):
+            scores = user.get("scores", [])
+            update = {"scores": [dict(score, timestamp=convert(score.get("timestamp"))) for score in scores]}
+            if isinstance(user.get("last_practice_date"), str):
+                update["last_practice_date"] = convert(user["last_practice_date"]) or None
+
+            # Applies only if play_game or compaction hasn't changed the scores array since the read
+            result = users.update_one({"_id": user["_id"], "scores": {"$size": len(scores)}}, {"$set": update})
+            if result.matched_count:
+                migrated += 1
+                break
+            user = users.find_one({"_id": user["_id"]}, USER_PROJECTION)
+            if user is None:
+                break
+        else:
+            skipped += 1
+    return migrated, skipped
+
+
+def migrate_buckets(history):
+    ensure_history_indexes(history)
+    migrated = 0
+    merged = 0
+    for bucket in history.find({"day": {"$type": "string"}}).batch_size(500):
+        day = as_day(bucket["day"])
+        if day is None:
+            continue
+        try:
+            history.update_one({"_id": bucket["_id"]}, {"$set": {"day": day}})
+            migrated += 1
+        except DuplicateKeyError:
+            # play_game already started a native bucket for this day; fold the old one into it
+            history.update_one(
+                {"email": bucket["email"], "day": day},
+                {
+                    "$inc": {"attempts": bucket.get("attempts", 0), "accuracy_sum": bucket.get("accuracy_sum", 0),
+                             "score_sum": bucket.get("score_sum", 0)},
+                    "$max": {"best_accuracy": bucket.get("best_accuracy", 0)}
+                }
+            )
+            history.delete_one({"_id": bucket["_id"]})
+            merged += 1
+    return migrated, merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migrate string dates to native BSON dates.')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI'), help='MongoDB connection string')
+    args = parser.parse_args(argv)
+
+    if not args.mongo_uri:
+        parser.error("--mongo-uri or MONGO_URI is required")
+
+    db = MongoClient(args.mongo_uri).get_default_database('spello_database')
+    users_migrated, users_skipped = migrate_users(db.sp1)
+    buckets_migrated, buckets_merged = migrate_buckets(db.score_history)
+    print(f"Migrated {users_migrated} users ({users_skipped} skipped after {MAX_RETRIES} conflicting writes)")
+    print(f"Migrated {buckets_migrated} day buckets, merged {buckets_merged} into existing ones")
+    return 1 if users_skipped else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
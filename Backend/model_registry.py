@@ -0,0 +1,118 @@
+"""
+Registry of Vosk models that are loaded on first use and evicted least
+recently used first when the loaded models go over a memory budget.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def current_rss_bytes():
+    # Resident set size from /proc where available; 0 elsewhere
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class UnknownModel(KeyError):
+    pass
+
+
+class ModelRegistry:
+    """
+    Maps model keys (e.g. "en-small") to model directories.
+
+    A loaded model is shared by every recognizer that asks for its key.
+    Evicting a model only drops the registry's reference, so recognizers
+    already decoding with it keep working until they finish. A model's
+    memory is the RSS growth seen while it loaded, or its size on disk when
+    that can't be measured.
+    """
+
+    def __init__(self, paths, default, memory_budget=0, loader=None):
+        if default not in paths:
+            raise ValueError(f"Default model {default!r} is not one of: {', '.join(paths)}")
+        self.paths = dict(paths)
+        self.default = default
+        self.memory_budget = memory_budget  # bytes, 0 for no limit
+        self.loader = loader
+        self.loaded = OrderedDict()  # key -> model, least recently used first
+        self.info = {key: {"loaded": False, "loads": 0, "evictions": 0, "load_seconds": None,
+                           "resident_bytes": 0, "last_used": None} for key in self.paths}
+        self.lock = threading.Lock()
+        self.load_locks = {key: threading.Lock() for key in self.paths}
+
+    def resolve(self, key=None):
+        key = key or self.default
+        if key not in self.paths:
+            raise UnknownModel(key)
+        return key
+
+    def path(self, key=None):
+        return self.paths[self.resolve(key)]
+
+    def get(self, key=None):
+        key = self.resolve(key)
+        with self.lock:
+            if key in self.loaded:
+                self.loaded.move_to_end(key)
+                self.info[key]["last_used"] = time.time()
+                return self.loaded[key]
+
+        # Loads of different models can run side by side; a second request for the same one waits
+        with self.load_locks[key]:
+            with self.lock:
+                if key in self.loaded:
+                    self.loaded.move_to_end(key)
+                    return self.loaded[key]
+
+            rss_before = current_rss_bytes()
+            started = time.monotonic()
+            model = self.loader(self.paths[key])
+            load_seconds = time.monotonic() - started
+            resident = current_rss_bytes() - rss_before
+            if resident <= 0:
+                resident = directory_bytes(self.paths[key])
+
+            with self.lock:
+                self.loaded[key] = model
+                self.info[key].update(loaded=True, load_seconds=round(load_seconds, 3), resident_bytes=resident,
+                                      last_used=time.time(), loads=self.info[key]["loads"] + 1)
+                self.evict(keep=key)
+            return model
+
+    def evict(self, keep):
+        # Called with the lock held; never evicts the model that was just asked for
+        while self.memory_budget and self.resident_bytes() > self.memory_budget:
+            victim = next((key for key in self.loaded if key != keep), None)
+            if victim is None:
+                break
+            del self.loaded[victim]
+            self.info[victim].update(loaded=False, resident_bytes=0, evictions=self.info[victim]["evictions"] + 1)
+
+    def resident_bytes(self):
+        return sum(self.info[key]["resident_bytes"] for key in self.loaded)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "default": self.default,
+                "memory_budget_bytes": self.memory_budget,
+                "resident_bytes": self.resident_bytes(),
+                "models": {key: dict(info) for key, info in self.info.items()}
+            }
@@ -0,0 +1,170 @@
+"""
+Create many users at once from a roster (e.g. onboarding a school).
+
+Passwords are hashed in parallel across processes, and the users are
+written with one unordered insert_many. Existing accounts and repeated
+emails in the roster are caught by the unique email index, not by a
+lookup per user. Every row that wasn't created is reported with its row
+number and the reason.
+
+Roster files are CSV with a header row: name, email and password are
+required; age, gender and group are optional.
+
+Usage:
+    MONGO_URI="mongodb+srv://..." python provisioning.py roster.csv
+    python provisioning.py roster.csv --workers 8 --json report.json
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from werkzeug.security import generate_password_hash
+
+ROSTER_FIELDS = ['name', 'email', 'password', 'age', 'gender', 'group']
+REQUIRED_FIELDS = ['name', 'email', 'password']
+EMAIL_INDEX = 'email_1'
+DUPLICATE_KEY = 11000
+# Below this many passwords starting worker processes costs more than it saves
+MIN_PARALLEL = 16
+INSERT_BATCH_SIZE = 1000
+
+
+class ProvisioningError(Exception):
+    pass
+
+
+def new_user(name, email, hashed_password, age='', gender='', group=''):
+    return {
+        'email': email,
+        'password': hashed_password,
+        'name': name,
+        'age': age,
+        'gender': gender,
+        'group': group,
+        'custom_words': [],
+        'selected_sounds': [],
+        'total_score': 0,
+        'level': 1,
+        'attempts': 0,
+        'lives': 5,
+        'scores': [],
+        'current_streak': 0,
+        'max_streak': 0,
+        'last_practice_date': None
+    }
+
+
+def ensure_unique_email_index(users):
+    index = users.index_information().get(EMAIL_INDEX)
+    if index and index.get('unique'):
+        return
+    if index:
+        users.drop_index(EMAIL_INDEX)
+    try:
+        users.create_index([("email", 1)], unique=True, name=EMAIL_INDEX)
+    except (DuplicateKeyError, OperationFailure):
+        # Keep email lookups fast until the duplicates are cleaned up
+        users.create_index([("email", 1)], name=EMAIL_INDEX)
+        raise ProvisioningError("Some existing users share an email address; remove the duplicates first")
+
+
+def read_roster(data):
+    # Rows from CSV text or bytes, with the header names lower-cased
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    reader = csv.DictReader(io.StringIO(data))
+    return [{(key or '').strip().lower(): (value or '').strip() for key, value in row.items()} for row in reader]
+
+
+def validate_rows(rows):
+    """Split rows into (row number, row) pairs to create and per-row errors. Rows are numbered from 1."""
+    valid = []
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": number, "email": None, "error": "Row must be an object"})
+            continue
+        missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or '').strip()]
+        if missing:
+            errors.append({"row": number, "email": row.get('email'), "error": f"Missing {', '.join(missing)}"})
+            continue
+        valid.append((number, {field: str(row.get(field) or '').strip() for field in ROSTER_FIELDS}))
+    return valid, errors
+
+
+def hash_passwords(passwords, workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < MIN_PARALLEL:
+        return [generate_password_hash(password) for password in passwords]
+    # spawn rather than fork: the server process has threads (and possibly models) we don't want copied
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(passwords)), mp_context=context) as executor:
+        return list(executor.map(generate_password_hash, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def provision(users, rows, workers=None):
+    """
+    Create users from roster rows (dicts with ROSTER_FIELDS).
+    Returns {"created": n, "errors": [{"row", "email", "error"}, ...]}.
+    """
+    ensure_unique_email_index(users)
+    valid, errors = validate_rows(rows)
+    hashed = hash_passwords([row['password'] for _, row in valid], workers)
+
+    created = 0
+    for start in range(0, len(valid), INSERT_BATCH_SIZE):
+        batch = valid[start:start + INSERT_BATCH_SIZE]
+        documents = [new_user(row['name'], row['email'], password, row['age'], row['gender'], row['group'])
+                     for (_, row), password in zip(batch, hashed[start:start + INSERT_BATCH_SIZE])]
+        try:
+            created += len(users.insert_many(documents, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            created += e.details.get('nInserted', 0)
+            for error in e.details.get('writeErrors', []):
+                number, row = batch[error['index']]
+                message = 'User already exists' if error.get('code') == DUPLICATE_KEY else error.get('errmsg')
+                errors.append({"row": number, "email": row['email'], "error": message})
+
+    errors.sort(key=lambda error: error["row"])
+    return {"created": created, "errors": errors}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create users from a CSV roster.')
+    parser.add_argument('roster', help='CSV file with name, email, password and optional age, gender, group columns')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI'), help='MongoDB connection string')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes used to hash passwords')
+    parser.add_argument('--json', help='also write the report (with every row error) to this file')
+    args = parser.parse_args(argv)
+
+    if not args.mongo_uri:
+        parser.error("--mongo-uri or MONGO_URI is required")
+
+    with open(args.roster, 'rb') as f:
+        rows = read_roster(f.read())
+    users = MongoClient(args.mongo_uri).get_default_database('spello_database').sp1
+    try:
+        report = provision(users, rows, args.workers)
+    except ProvisioningError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Created {report['created']} of {len(rows)} users")
+    for error in report['errors']:
+        print(f"  row {error['row']} ({error['email'] or 'no email'}): {error['error']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Speech recognition helpers shared by the Flask routes and the benchmark tools.
+"""
+
+import json
+import time
+import wave
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+    import soundfile
+except ImportError:  # compressed uploads are rejected with a 415 without them
+    np = None
+    soundfile = None
+
+# Vosk recognizers are created for 16kHz mono 16-bit PCM
+SAMPLE_RATE = 16000
+
+# Audio is read and decoded in quarter-second chunks of 16kHz 16-bit PCM
+CHUNK_BYTES = 8000
+
+# Magic bytes of the compressed containers decoded with soundfile (OGG carries Opus or Vorbis)
+COMPRESSED_FORMATS = {b'OggS': 'ogg', b'fLaC': 'flac'}
+
+AudioInfo = namedtuple('AudioInfo', ['cache_key', 'sample_rate', 'seconds'])
+
+
+class AudioError(Exception):
+    """Raised when an upload can't be read or is outside the configured limits."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# Work out the container from the first bytes of the upload; clients don't label uploads reliably
+def detect_format(header):
+    if header[0:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    return COMPRESSED_FORMATS.get(header[0:4], 'raw')
+
+
+def peek_format(stream):
+    stream.seek(0)
+    header = stream.read(12)
+    stream.seek(0)
+    return detect_format(header)
+
+
+def open_compressed(stream):
+    if soundfile is None:
+        raise AudioError("Compressed audio uploads need the soundfile package installed", 415)
+    try:
+        return soundfile.SoundFile(stream)
+    except RuntimeError as e:
+        raise AudioError(f"Unsupported or corrupt audio file: {e}", 415)
+
+
+# Return (sample_rate, chunk iterator) of 16-bit mono PCM for a WAV, Opus/Vorbis OGG, FLAC or raw PCM upload
+def read_pcm_chunks(stream, chunk_bytes=CHUNK_BYTES, max_seconds=None):
+    audio_format = peek_format(stream)
+
+    if audio_format == 'raw':
+        def raw_chunks():
+            while True:
+                chunk = stream.read(chunk_bytes)
+                if not chunk:
+                    return
+                yield chunk
+        return SAMPLE_RATE, raw_chunks()
+
+    if audio_format == 'wav':
+        try:
+            wav = wave.open(stream, 'rb')
+        except (wave.Error, EOFError) as e:
+            raise AudioError(f"Invalid WAV file: {e}", 415)
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise AudioError("WAV audio must be mono 16-bit PCM", 415)
+
+        def wav_chunks():
+            frames = chunk_bytes // 2
+            while True:
+                chunk = wav.readframes(frames)
+                if not chunk:
+                    return
+                yield chunk
+        return wav.getframerate(), wav_chunks()
+
+    # Compressed audio is decoded block by block straight to int16 so no full decoded copy is kept
+    audio = open_compressed(stream)
+    sample_rate = audio.samplerate
+    max_frames = max_seconds * sample_rate if max_seconds else None
+
+    def compressed_chunks():
+        frames = chunk_bytes // 2 * sample_rate // SAMPLE_RATE
+        decoded = 0
+        with audio:
+            blocks = audio.blocks(blocksize=frames, dtype='int16', always_2d=True)
+            while True:
+                # A valid header can still hide a corrupt body, which only fails once it is decoded
+                try:
+                    block = next(blocks, None)
+                except RuntimeError as e:
+                    raise AudioError(f"Unsupported or corrupt audio file: {e}", 415)
+                if block is None:
+                    return
+                decoded += len(block)
+                # The container length can lie, so enforce the limit on what is actually decoded
+                if max_frames and decoded > max_frames:
+                    raise AudioError(f"Audio is longer than the {max_seconds:g} second limit", 413)
+                if block.shape[1] > 1:
+                    block = block.mean(axis=1).astype(np.int16)  # downmix to mono
+                else:
+                    block = block[:, 0]
+                yield block.tobytes()
+    return sample_rate, compressed_chunks()
+
+
+# Single pass over an upload that enforces the duration limit and hashes the audio for the cache
+def scan_audio(stream, max_seconds, model='', grammar=None):
+    digest = hashlib.blake2b(digest_size=16)
+
+    if peek_format(stream) in COMPRESSED_FORMATS.values():
+        # Duration comes from the container, and the compressed bytes are hashed as they are
+        with open_compressed(stream) as audio:
+            sample_rate = audio.samplerate
+            seconds = audio.frames / sample_rate
+        if seconds > max_seconds:
+            raise AudioError(f"Audio is longer than the {max_seconds:g} second limit", 413)
+        if not seconds:
+            raise AudioError("Audio data missing", 400)
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(CHUNK_BYTES * 8), b''):
+            digest.update(chunk)
+        return AudioInfo(TranscriptCache.finish_key(digest, model, grammar, sample_rate), sample_rate, seconds)
+
+    sample_rate, chunks = read_pcm_chunks(stream)
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > max_seconds * sample_rate * 2:
+            raise AudioError(f"Audio is longer than the {max_seconds:g} second limit", 413)
+        digest.update(chunk)
+
+    if total == 0:
+        raise AudioError("Audio data missing", 400)
+
+    cache_key = TranscriptCache.finish_key(digest, model, grammar, sample_rate)
+    return AudioInfo(cache_key, sample_rate, total / (sample_rate * 2))
+
+
+# Feed PCM chunks through a Vosk recognizer and return (spoken text, completed before the deadline)
+def transcribe(recognizer, chunks, deadline=None):
+    texts = []
+    complete = True
+    for chunk in chunks:
+        if deadline is not None and time.monotonic() > deadline:
+            complete = False
+            break
+        if recognizer.AcceptWaveform(chunk):
+            texts.append(json.loads(recognizer.Result()).get("text", ""))
+    texts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+
+    spoken = " ".join(text for text in texts if text)
+    return spoken.strip().capitalize(), complete
+
+
+class TranscriptCache:
+    """
+    Bounded LRU cache of transcripts keyed by a hash of the normalized audio and
+    the recognition configuration, so retried uploads skip the Vosk decode.
+    """
+
+    # Rough per-entry bookkeeping cost on top of the key and transcript
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def finish_key(digest, model, grammar, sample_rate):
+        # The recognition configuration is part of the key so a model or grammar change misses
+        config = json.dumps([model, grammar, sample_rate])
+        digest.update(config.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def entry_size(self, key, value):
+        return len(key) + len(str(value)) + self.ENTRY_OVERHEAD
+
+    def put(self, key, value):
+        entry_size = self.entry_size(key, value)
+        if entry_size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entry_size(key, self.entries.pop(key))
+            self.entries[key] = value
+            self.size += entry_size
+            # Evict least recently used entries until the cache fits its budget again
+            while self.size > self.max_bytes:
+                old_key, old_value = self.entries.popitem(last=False)
+                self.size -= self.entry_size(old_key, old_value)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "size_bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0
+            }
+
+
+class RecognizerPool:
+    """
+    Recognizers created in the background ahead of the next attempt, per
+    model and sample rate. Each one is handed out for a single decode; when
+    none is ready a new one is created on the spot, as before.
+    """
+
+    def __init__(self, load_model, create, size=2):
+        self.load_model = load_model  # model key -> model (loads it if needed)
+        self.create = create  # (model, sample_rate) -> recognizer
+        self.size = size
+        self.ready = {}
+        self.pending = set()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recognizer-prefetch')
+
+    def take(self, model_key, sample_rate=SAMPLE_RATE):
+        model = self.load_model(model_key)
+        with self.lock:
+            ready = self.ready.get((model_key, sample_rate), [])
+            while ready:
+                pooled_model, recognizer = ready.pop()
+                # Skip recognizers built for a model that was evicted and loaded again since
+                if pooled_model is model:
+                    self.hits += 1
+                    return recognizer
+            self.misses += 1
+        return self.create(model, sample_rate)
+
+    def prefetch(self, model_key, sample_rate=SAMPLE_RATE):
+        key = (model_key, sample_rate)
+        with self.lock:
+            if key in self.pending or len(self.ready.get(key, ())) >= self.size:
+                return False
+            self.pending.add(key)
+        self.executor.submit(self.fill, key)
+        return True
+
+    def fill(self, key):
+        try:
+            model = self.load_model(key[0])
+            entry = (model, self.create(model, key[1]))
+        except Exception:
+            entry = None  # take() creates one itself and reports the error to the request
+        with self.lock:
+            self.pending.discard(key)
+            if entry is not None:
+                self.ready.setdefault(key, []).append(entry)
+
+    def stats(self):
+        with self.lock:
+            takes = self.hits + self.misses
+            return {
+                "ready": sum(len(ready) for ready in self.ready.values()),
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / takes, 4) if takes else 0
+            }
@@ -0,0 +1,187 @@
+"""
+Recompute the accuracy of archived attempts with a (new) speech model.
+
+Reads the clips written by the audio archive (AUDIO_ARCHIVE_DIR), decodes
+them on a pool of worker processes that each load the model once, and
+updates the attempts in bulk, in MongoDB or the SQLite file
+(STORAGE_BACKEND): the accuracy and spoken word of each attempt (matched by
+its audio_key), plus the accuracy sum and best accuracy of its day bucket.
+Points already awarded are left as they are. Clips are fed to the pool a
+few at a time, so the archive is streamed rather than loaded.
+
+Progress (clips and audio seconds per second) is printed as it goes, and
+the final numbers can be written as JSON.
+
+Usage:
+    MONGO_URI="mongodb+srv://..." python rescore.py --archive-dir audio_archive --model vosk-model-en-us-0.22
+    python rescore.py --archive-dir audio_archive --model ../Vosk_Model --since 2024-09-01 --workers 8 --json report.json
+    python rescore.py --storage sqlite --sqlite-path spello.db --archive-dir audio_archive --model ../Vosk_Model
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from pymongo import MongoClient
+
+from audio_archive import iter_index, read_clip
+from storage import BACKENDS, MongoStorage, SqliteStorage
+from recognition import CHUNK_BYTES, np, transcribe
+from scoring import calculate_accuracy
+from vad import EnergyGate
+
+BATCH_SIZE = 500
+# Clips submitted per worker ahead of the results being collected
+IN_FLIGHT_PER_WORKER = 4
+
+# Set in each worker process by init_worker
+worker_model = None
+worker_factory = None
+
+
+def load_model(path):
+    import vosk
+    return vosk.Model(path)
+
+
+def create_recognizer(model, sample_rate):
+    import vosk
+    return vosk.KaldiRecognizer(model, sample_rate)
+
+
+def init_worker(model_path, loader=load_model, factory=create_recognizer):
+    global worker_model, worker_factory
+    worker_model = loader(model_path)
+    worker_factory = factory
+
+
+def rescore_clip(clip):
+    """Decode one archived clip. Returns (clip, spoken_word, accuracy, error)."""
+    try:
+        pcm = read_clip(clip['path'])
+    except (OSError, EOFError, RuntimeError) as e:
+        return clip, None, None, str(e)
+    chunks = (pcm[start:start + CHUNK_BYTES] for start in range(0, len(pcm), CHUNK_BYTES))
+    if np is not None:
+        # Trimmed like the live request, so both see the same audio
+        chunks = EnergyGate(clip['sample_rate']).filter(chunks)
+    try:
+        spoken_word, _ = transcribe(worker_factory(worker_model, clip['sample_rate']), chunks)
+    except Exception as e:
+        return clip, None, None, str(e)
+    return clip, spoken_word, calculate_accuracy(clip.get('target_word', ''), spoken_word), None
+
+
+def decode_clips(clips, workers, model_path, loader=load_model, factory=create_recognizer):
+    """Yield rescore_clip results, decoding on `workers` processes (in this process when workers is 0)."""
+    if workers <= 0:
+        init_worker(model_path, loader, factory)
+        for clip in clips:
+            yield rescore_clip(clip)
+        return
+
+    # spawn so each worker starts clean and loads its own copy of the model
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(model_path, loader, factory)) as executor:
+        pending = set()
+        for clip in clips:
+            pending.add(executor.submit(rescore_clip, clip))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def rescore(storage, clips, model_path, workers=0, batch_size=BATCH_SIZE, progress=None,
+            loader=load_model, factory=create_recognizer):
+    """
+    Rescore archived clips (entries from audio_archive.iter_index) and save the new accuracies to `storage`.
+    Returns {"clips", "updated", "missing", "failed", "seconds", "audio_seconds", "clips_per_second",
+    "audio_seconds_per_second", "errors"}; `progress` is called with the running report after each batch.
+    """
+    model_name = os.path.basename(os.path.normpath(model_path))
+    report = {"clips": 0, "updated": 0, "missing": 0, "failed": 0, "seconds": 0, "audio_seconds": 0,
+              "clips_per_second": 0, "audio_seconds_per_second": 0, "errors": []}
+    started = time.perf_counter()
+    batch = []
+
+    def flush():
+        if batch:
+            results = {clip['key']: (spoken_word, accuracy) for clip, spoken_word, accuracy in batch}
+            updated = storage.rescore_attempts(results, model_name)
+            report["updated"] += updated
+            report["missing"] += len(results) - updated
+        batch.clear()
+        elapsed = time.perf_counter() - started
+        report["seconds"] = round(elapsed, 2)
+        report["clips_per_second"] = round(report["clips"] / elapsed, 1) if elapsed else 0
+        report["audio_seconds_per_second"] = round(report["audio_seconds"] / elapsed, 1) if elapsed else 0
+        if progress:
+            progress(report)
+
+    for clip, spoken_word, accuracy, error in decode_clips(clips, workers, model_path, loader, factory):
+        report["clips"] += 1
+        report["audio_seconds"] = round(report["audio_seconds"] + clip.get('seconds', 0), 3)
+        if error:
+            report["failed"] += 1
+            report["errors"].append({"key": clip['key'], "error": error})
+            continue
+        batch.append((clip, spoken_word, accuracy))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recompute attempt accuracies from archived recordings.')
+    parser.add_argument('--archive-dir', default=os.environ.get('AUDIO_ARCHIVE_DIR'), help='the audio archive directory')
+    parser.add_argument('--model', required=True, help='Vosk model directory to decode with')
+    parser.add_argument('--storage', choices=BACKENDS, default=os.environ.get('STORAGE_BACKEND', 'mongo'),
+                        help='where the attempts are stored (default: STORAGE_BACKEND or mongo)')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI'), help='MongoDB connection string')
+    parser.add_argument('--sqlite-path', default=os.environ.get('SQLITE_PATH'), help='SQLite file, with --storage sqlite')
+    parser.add_argument('--since', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        help='only clips archived on or after this day (YYYY-MM-DD)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='decoding processes (0 decodes inline)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='attempts updated per bulk write')
+    parser.add_argument('--json', help='also write the final report to this file')
+    args = parser.parse_args(argv)
+
+    if not args.archive_dir:
+        parser.error("--archive-dir or AUDIO_ARCHIVE_DIR is required")
+    if args.storage == 'sqlite':
+        if not args.sqlite_path:
+            parser.error("--sqlite-path or SQLITE_PATH is required with sqlite storage")
+        storage = SqliteStorage(args.sqlite_path)
+    else:
+        if not args.mongo_uri:
+            parser.error("--mongo-uri or MONGO_URI is required")
+        db = MongoClient(args.mongo_uri).get_default_database('spello_database')
+        storage = MongoStorage(db.sp1, db.score_history)
+
+    def progress(report):
+        print(f"{report['clips']} clips ({report['updated']} updated, {report['failed']} failed) in "
+              f"{report['seconds']}s: {report['clips_per_second']} clips/s, "
+              f"{report['audio_seconds_per_second']} audio s/s", flush=True)
+
+    report = rescore(storage, iter_index(args.archive_dir, args.since), args.model, args.workers, args.batch_size,
+                     progress)
+    print(f"Rescored {report['updated']} attempts from {report['clips']} clips "
+          f"({report['missing']} no longer stored, {report['failed']} failed)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+The app's heavy resources (database, speech models, caches), created on first use.
+
+create_app() builds one Resources per app. The database connection, Vosk
+and the models are only touched when a request (or warmup) needs them, so
+importing the app, collecting tests and running CLI tools stay fast.
+Anything can be passed in instead, e.g. a mongomock database in tests.
+"""
+
+import threading
+
+from flask_pymongo import PyMongo
+
+from recognition import SAMPLE_RATE, RecognizerPool, TranscriptCache
+from leaderboard import LeaderboardCache, ensure_leaderboard_indexes
+from history import ensure_history_indexes
+from vocabulary import CollectionSource, FileSource, VocabularyStore
+from model_registry import ModelRegistry
+from admission import AdmissionController
+from compression import ResponseStats
+from auth import PasswordVerifier
+from storage import MongoStorage, SqliteStorage
+from provisioning import ProvisioningError, ensure_unique_email_index
+from audio_archive import AudioArchive
+
+
+def load_vosk_model(path):
+    import vosk  # only imported once a model is actually needed
+    return vosk.Model(path)
+
+
+def create_vosk_recognizer(model, sample_rate):
+    import vosk
+    return vosk.KaldiRecognizer(model, sample_rate)
+
+
+# Words in the vocabulary the default speech model can't recognize
+def find_unknown_words(models, vocab):
+    model = models.get()
+    return [word for word in vocab.words if any(model.find_word(token) < 0 for token in vocab.normalized[word].split())]
+
+
+class Resources:
+    def __init__(self, app, db=None, model_loader=None, recognizer_factory=None):
+        config = app.config
+        self.app = app
+        self._db = db
+        self.lock = threading.RLock()
+        self.recognizer_factory = recognizer_factory or create_vosk_recognizer
+
+        # models are loaded on first use and the least recently used ones are dropped over the budget
+        self.models = ModelRegistry(config['VOSK_MODELS'], config['DEFAULT_MODEL'],
+                                    memory_budget=config['MODEL_MEMORY_BUDGET_BYTES'],
+                                    loader=model_loader or load_vosk_model)
+        # recognizers created ahead of the next attempt while the result is on screen
+        self.recognizers = RecognizerPool(self.models.get, self.recognizer_factory, size=config['RECOGNIZER_POOL_SIZE'])
+        # cache of recent transcripts so retried uploads of the same audio skip decoding
+        self.transcript_cache = TranscriptCache(config['RECOGNITION_CACHE_BYTES'])
+        # bounded queue of decodes; overflow is turned away with 503 + Retry-After
+        self.admission = AdmissionController(config['RECOGNITION_CONCURRENCY'], config['RECOGNITION_QUEUE_DEPTH'],
+                                             config['RECOGNITION_QUEUE_WAIT_SECONDS'])
+        # password checks for /login, on worker processes with a bounded queue
+        self.password_verifier = PasswordVerifier(config['LOGIN_HASH_WORKERS'], config['LOGIN_QUEUE_DEPTH'])
+        # payload size, encode and compression time per route
+        self.response_stats = ResponseStats()
+        # top-k leaderboards, refreshed in place by play_game
+        self.leaderboard = LeaderboardCache(size=config['LEADERBOARD_SIZE'])
+        # target and spoken word between /get-target-word, /speech-to-text and /play-game
+        self.session_data = {}
+        self.indexes_ready = False
+        self._vocabulary = None
+        self._storage = None
+        self._audio_archive = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            with self.lock:
+                if self._db is None:
+                    self._db = PyMongo(self.app).db
+        return self._db
+
+    @property
+    def users(self):
+        return self.db.sp1
+
+    @property
+    def score_history(self):
+        return self.db.score_history  # per-user, per-day score buckets
+
+    @property
+    def word_difficulty(self):
+        return self.db.word_difficulty  # per-word and per-sound stats from word_stats.py
+
+    @property
+    def storage(self):
+        # the game loop's reads and writes, in MongoDB or an embedded SQLite file
+        if self._storage is None:
+            with self.lock:
+                if self._storage is None:
+                    config = self.app.config
+                    if config['STORAGE_BACKEND'] == 'sqlite':
+                        self._storage = SqliteStorage(config['SQLITE_PATH'], config['SQLITE_POOL_SIZE'])
+                    else:
+                        self._storage = MongoStorage(self.users, self.score_history)
+        return self._storage
+
+    @property
+    def audio_archive(self):
+        # recordings written to disk in the background for offline rescoring; None unless AUDIO_ARCHIVE_DIR is set
+        directory = self.app.config['AUDIO_ARCHIVE_DIR']
+        if self._audio_archive is None and directory:
+            with self.lock:
+                if self._audio_archive is None:
+                    self._audio_archive = AudioArchive(directory, self.app.config['AUDIO_ARCHIVE_QUEUE'])
+        return self._audio_archive
+
+    @property
+    def vocabulary(self):
+        # practice words, reloaded in the background when the file or collection changes
+        if self._vocabulary is None:
+            with self.lock:
+                if self._vocabulary is None:
+                    config = self.app.config
+                    if config['VOCABULARY_SOURCE'] == 'mongo':
+                        source = CollectionSource(self.db.vocabulary)
+                    else:
+                        source = FileSource(config['VOCABULARY_PATH'])
+                    validator = (lambda vocab: find_unknown_words(self.models, vocab)) \
+                        if config['VOCABULARY_CHECK_MODEL'] else None
+                    self._vocabulary = VocabularyStore(source, validator, config['VOCABULARY_CHECK_SECONDS'])
+        return self._vocabulary
+
+    def create_recognizer(self, sample_rate=SAMPLE_RATE, model_key=None):
+        return self.recognizers.take(self.models.resolve(model_key), sample_rate)
+
+    def prefetch_recognizer(self, model_key=None, sample_rate=SAMPLE_RATE):
+        self.recognizers.prefetch(self.models.resolve(model_key), sample_rate)
+
+    def ensure_indexes(self):
+        # indexes are created on first use so starting the app doesn't need the database
+        # (SQLite creates its tables and indexes when the file is opened)
+        if not self.indexes_ready and self.app.config['STORAGE_BACKEND'] == 'mongo':
+            try:
+                ensure_unique_email_index(self.users)
+            except ProvisioningError:
+                pass  # duplicate emails already stored; a plain index is kept
+            ensure_leaderboard_indexes(self.users)
+            ensure_history_indexes(self.score_history)
+            self.indexes_ready = True
+
+    def warmup(self):
+        """Load the default model and run one short decode so the first real request doesn't pay for it."""
+        recognizer = self.create_recognizer()
+        recognizer.AcceptWaveform(b'\x00\x00' * (SAMPLE_RATE // 2))
+        recognizer.FinalResult()
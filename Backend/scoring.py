@@ -0,0 +1,32 @@
+"""
+Accuracy and points for an attempt, shared by the app and offline jobs (rescore.py).
+"""
+
+from rapidfuzz.distance import Levenshtein
+
+
+# Function to calculate similarity percentage
+def calculate_accuracy(target, spoken):
+    if not spoken:
+        return 0  # No spoken word detected
+    distance = Levenshtein.distance(target, spoken)
+    max_length = max(len(target), len(spoken))
+    accuracy = ((max_length - distance) / max_length) * 100
+    return round(accuracy, 2)
+
+
+def calculate_score(accuracy, level):
+    if level == 1:
+        if accuracy > 75:
+            return 100
+        elif accuracy >= 50:
+            return int((accuracy - 50) * 4)
+        else:
+            return 0
+    elif level >= 2:
+        if accuracy > 85:
+            return 100
+        elif accuracy >= 50:
+            return int((accuracy - 50) * 2)
+        else:
+            return 0
@@ -0,0 +1,398 @@
+"""
+Storage for the game loop: MongoDB (the default) or an embedded SQLite file.
+
+Both backends provide the operations the practice routes need: find,
+create and update a user, append an attempt, read the dashboard
+summary and trend, and save rescored accuracies (rescore.py). SQLite (STORAGE_BACKEND=sqlite) is meant for on-prem
+or offline boxes that shouldn't wait on a remote cluster. It runs in WAL
+mode so readers don't block the writer, uses a small pool of shared
+connections, and keeps the per-day buckets in their own table so the
+dashboard is aggregated in SQL. Routes that only exist for MongoDB (exports,
+leaderboards, analytics, ...) return 501 with the SQLite backend.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+from urllib.parse import unquote
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from history import DATE_FORMAT, as_day, build_trend, read_trend, record_attempt
+from compact_history import summarize
+
+BACKENDS = ('mongo', 'sqlite')
+# Dashboard reads take the profile only; attempt totals come from the day buckets
+DASHBOARD_PROJECTION = {"password": 0, "scores": 0}
+# Best accuracy per target word over every attempt, kept on MongoDB user documents for the dashboard
+WORD_BEST_FIELD = 'word_best_accuracy'
+# Profile fields holding a day, stored as 'YYYY-MM-DD' in SQLite
+DATE_FIELDS = ('last_practice_date',)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    profile TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    target_word TEXT,
+    spoken_word TEXT,
+    accuracy REAL NOT NULL,
+    score REAL NOT NULL,
+    day TEXT NOT NULL,
+    audio_key TEXT  -- the archived recording (audio_archive.py), for rescore.py
+);
+-- Best accuracy per word for the dashboard, read from the index alone
+CREATE INDEX IF NOT EXISTS attempts_user_word ON attempts (user_id, target_word, accuracy);
+CREATE TABLE IF NOT EXISTS score_history (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    accuracy_sum REAL NOT NULL,
+    score_sum REAL NOT NULL,
+    best_accuracy REAL NOT NULL,
+    PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+"""
+
+
+def word_field(word):
+    # Words become field names, so the characters MongoDB reserves in paths are escaped
+    return WORD_BEST_FIELD + '.' + word.replace('%', '%25').replace('.', '%2E').replace('$', '%24')
+
+
+def word_best_update(scores, summary=None):
+    """$max operations folding attempts (and a compacted summary) into a user's best accuracy per word."""
+    return {word_field(word): accuracy for word, accuracy in summarize(scores, summary)['best_accuracy'].items()}
+
+
+class DuplicateUser(Exception):
+    pass
+
+
+class MongoStorage:
+    """The existing MongoDB collections: users in sp1, day buckets in score_history."""
+
+    name = 'mongo'
+
+    def __init__(self, users, history):
+        self.users = users
+        self.history = history
+
+    def find_user(self, email, fields=None):
+        projection = {field: 1 for field in fields} if fields else {'scores': 0}
+        return self.users.find_one({'email': email}, projection)
+
+    def create_user(self, user):
+        try:
+            return self.users.insert_one(user).inserted_id
+        except DuplicateKeyError:
+            raise DuplicateUser(user['email'])
+
+    def update_user(self, email, fields):
+        """Set profile fields. Returns (matched, modified)."""
+        result = self.users.update_one({'email': email}, {'$set': fields})
+        return result.matched_count > 0, result.modified_count > 0
+
+    def append_attempt(self, email, fields, attempt):
+        """
+        The attempt and the profile changes it causes are one update to the user. Its day bucket is a
+        second write: buckets live in score_history so a trend reads only the days it covers, and
+        MongoDB can't update two collections in one operation (a transaction would add round trips
+        and needs a replica set). The user is written first, so if the bucket write fails the attempt
+        is still saved; `backfill_history.py --rebuild` recomputes the buckets from the scores.
+        """
+        update = {'$set': fields, '$push': {'scores': attempt}}
+        if attempt.get('target_word'):
+            update['$max'] = {word_field(attempt['target_word']): attempt['accuracy']}
+        self.users.update_one({'email': email}, update)
+        record_attempt(self.history, email, attempt['timestamp'], attempt['accuracy'], attempt['score'])
+
+    def dashboard(self, email):
+        """
+        The user's profile with an attempt summary (attempts, accuracy_sum, best_accuracy per word), or None.
+        Totals are summed from the day buckets and the best accuracies are kept on the user, so the
+        scores array isn't read. Both cover compacted attempts; backfill_history.py builds them for
+        users from before they were kept.
+        """
+        user = self.users.find_one({'email': email}, DASHBOARD_PROJECTION)
+        if not user:
+            return None
+        totals = next(self.history.aggregate([
+            {'$match': {'email': email}},
+            {'$group': {'_id': None, 'attempts': {'$sum': '$attempts'}, 'accuracy_sum': {'$sum': '$accuracy_sum'}}}
+        ]), {})
+        archived = user.pop('archived_summary', None)
+        best_accuracy = user.pop(WORD_BEST_FIELD, None)
+        if best_accuracy is None:
+            # Not backfilled yet: fold the scores the slow way
+            scores = self.users.find_one({'email': email}, {'scores.target_word': 1, 'scores.accuracy': 1})
+            best_accuracy = summarize(scores.get('scores', []), archived)['best_accuracy']
+        else:
+            best_accuracy = {unquote(word): accuracy for word, accuracy in best_accuracy.items()}
+        user['summary'] = {"attempts": totals.get('attempts', 0), "accuracy_sum": totals.get('accuracy_sum', 0),
+                           "best_accuracy": best_accuracy}
+        return user
+
+    def read_trend(self, email, start, end, granularity=None):
+        return read_trend(self.history, email, start, end, granularity)
+
+    def rescore_attempts(self, results, model_name):
+        """
+        Save new results for the attempts recorded with these audio keys ({audio_key: (spoken_word, accuracy)}).
+        Their day buckets' accuracy sum moves by the difference, and the best accuracy of their days and
+        words is recomputed, so it can go down. Returns the number of attempts found.
+        """
+        # Each attempt's current accuracy, and every attempt's accuracy per day and per word after rescoring
+        stored = {}
+        days = {}
+        words = {}
+        for user in self.users.find({'scores.audio_key': {'$in': list(results)}},
+                                    {'email': 1, 'scores.audio_key': 1, 'scores.accuracy': 1, 'scores.timestamp': 1,
+                                     'scores.target_word': 1, 'archived_summary.best_accuracy': 1}):
+            archived = user.get('archived_summary', {}).get('best_accuracy', {})
+            for score in user.get('scores', []):
+                key = score.get('audio_key')
+                day = as_day(score['timestamp']) if score.get('timestamp') else None
+                word = score.get('target_word')
+                accuracy = results[key][1] if key in results else score.get('accuracy', 0)
+                if key in results:
+                    stored[key] = (user['email'], score.get('accuracy', 0), day, word)
+                days.setdefault((user['email'], day), []).append(accuracy)
+                if word:
+                    words.setdefault((user['email'], word), [archived.get(word, 0)]).append(accuracy)
+
+        user_updates = []
+        changed_days = {}
+        changed_words = {}
+        for key, (email, old_accuracy, day, word) in stored.items():
+            spoken_word, accuracy = results[key]
+            user_updates.append(UpdateOne({'email': email, 'scores.audio_key': key}, {'$set': {
+                'scores.$.accuracy': accuracy,
+                'scores.$.spoken_word': spoken_word,
+                'scores.$.rescored_model': model_name
+            }}))
+            if day is not None and accuracy != old_accuracy:
+                changed_days[(email, day)] = changed_days.get((email, day), 0) + accuracy - old_accuracy
+            if word and accuracy != old_accuracy:
+                changed_words.setdefault(email, {})[word_field(word)] = max(words[(email, word)])
+        user_updates.extend(UpdateOne({'email': email}, {'$set': best}) for email, best in changed_words.items())
+
+        # The bests are set from the attempts read above; an attempt saved for the same day or word while
+        # this runs can be overwritten, so run rescoring off-hours
+        history_updates = [UpdateOne({'email': email, 'day': day}, {
+            '$inc': {'accuracy_sum': round(difference, 2)},
+            '$set': {'best_accuracy': max(days[(email, day)])}
+        }) for (email, day), difference in changed_days.items()]
+
+        if user_updates:
+            self.users.bulk_write(user_updates, ordered=False)
+        if history_updates:
+            self.history.bulk_write(history_updates, ordered=False)
+        return len(stored)
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT) if value == as_day(value) else value.isoformat()
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_profile(fields):
+    return json.dumps(fields, default=encode_value, separators=(',', ':'))
+
+
+class SqliteStorage:
+    """
+    Users, attempts and day buckets in one SQLite file.
+
+    Profile fields are kept as a JSON document per user (so new fields need no
+    migration) and updated in place with json_patch; attempts and buckets are
+    rows, so the dashboard is aggregated by SQLite.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, pool_size=4, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.pool = queue.LifoQueue()
+        self.pool_size = pool_size
+        self.opened = 0
+        self.waits = 0
+        self.lock = threading.Lock()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            self.migrate(conn)
+
+    def connect(self):
+        # Autocommit mode: transactions are started explicitly with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # durable at each checkpoint, safe with WAL
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @staticmethod
+    def migrate(conn):
+        # Files created before attempts kept the key of their recording
+        if 'audio_key' not in {row[1] for row in conn.execute("PRAGMA table_info(attempts)")}:
+            conn.execute("ALTER TABLE attempts ADD COLUMN audio_key TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS attempts_audio_key ON attempts (audio_key) WHERE audio_key IS NOT NULL")
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.pool_size
+                self.opened += 1 if can_open else 0
+            if can_open:
+                try:
+                    conn = self.connect()
+                except Exception:
+                    with self.lock:
+                        self.opened -= 1
+                    raise
+            else:
+                with self.lock:
+                    self.waits += 1
+                conn = self.pool.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        # IMMEDIATE takes the write lock up front so two writers never deadlock upgrading a read
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def load_user(row):
+        user_id, email, profile = row
+        user = json.loads(profile)
+        for field in DATE_FIELDS:
+            if user.get(field):
+                user[field] = as_day(user[field])
+        return dict(user, _id=user_id, email=email)
+
+    def find_user(self, email, fields=None):
+        with self.connection() as conn:
+            row = conn.execute("SELECT id, email, profile FROM users WHERE email = ?", (email,)).fetchone()
+        if row is None:
+            return None
+        user = self.load_user(row)
+        if fields:
+            return {field: user[field] for field in ['_id', *fields] if field in user}
+        return user
+
+    def create_user(self, user):
+        profile = {field: value for field, value in user.items() if field not in ('_id', 'email', 'scores')}
+        try:
+            with self.transaction() as conn:
+                return conn.execute("INSERT INTO users (email, profile) VALUES (?, json(?))",
+                                    (user['email'], dump_profile(profile))).lastrowid
+        except sqlite3.IntegrityError:
+            raise DuplicateUser(user['email'])
+
+    def update_user(self, email, fields):
+        patch = dump_profile(fields)
+        with self.transaction() as conn:
+            modified = conn.execute("UPDATE users SET profile = json_patch(profile, ?) "
+                                    "WHERE email = ? AND json_patch(profile, ?) != profile",
+                                    (patch, email, patch)).rowcount
+            if modified:
+                return True, True
+            matched = conn.execute("SELECT 1 FROM users WHERE email = ?", (email,)).fetchone() is not None
+        return matched, False
+
+    def append_attempt(self, email, fields, attempt):
+        # The profile update, the attempt row and its day bucket commit together
+        day = as_day(attempt['timestamp']).strftime(DATE_FORMAT)
+        accuracy, score = attempt['accuracy'], attempt['score']
+        with self.transaction() as conn:
+            row = conn.execute("UPDATE users SET profile = json_patch(profile, ?) WHERE email = ? RETURNING id",
+                               (dump_profile(fields), email)).fetchone()
+            if row is None:
+                return
+            conn.execute("INSERT INTO attempts (user_id, target_word, spoken_word, accuracy, score, day, audio_key) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (row[0], attempt['target_word'], attempt['spoken_word'], accuracy, score, day,
+                          attempt.get('audio_key')))
+            conn.execute("INSERT INTO score_history (user_id, day, attempts, accuracy_sum, score_sum, best_accuracy) "
+                         "VALUES (?, ?, 1, ?, ?, ?) ON CONFLICT (user_id, day) DO UPDATE SET "
+                         "attempts = attempts + 1, accuracy_sum = accuracy_sum + excluded.accuracy_sum, "
+                         "score_sum = score_sum + excluded.score_sum, "
+                         "best_accuracy = max(best_accuracy, excluded.best_accuracy)",
+                         (row[0], day, accuracy, score, accuracy))
+
+    def dashboard(self, email):
+        with self.connection() as conn:
+            row = conn.execute("SELECT id, email, profile FROM users WHERE email = ?", (email,)).fetchone()
+            if row is None:
+                return None
+            attempts, accuracy_sum = conn.execute(
+                "SELECT COALESCE(SUM(attempts), 0), COALESCE(SUM(accuracy_sum), 0) FROM score_history "
+                "WHERE user_id = ?", (row[0],)).fetchone()
+            # Words in the order they were first practised, like the MongoDB summary
+            best_accuracy = conn.execute(
+                "SELECT target_word, MAX(accuracy) FROM attempts WHERE user_id = ? AND target_word != '' "
+                "GROUP BY target_word ORDER BY MIN(id)", (row[0],)).fetchall()
+        user = self.load_user(row)
+        user.pop('password', None)
+        user['summary'] = {"attempts": attempts, "accuracy_sum": accuracy_sum, "best_accuracy": dict(best_accuracy)}
+        return user
+
+    def read_trend(self, email, start, end, granularity=None):
+        with self.connection() as conn:
+            buckets = conn.execute(
+                "SELECT day, attempts, accuracy_sum FROM score_history "
+                "WHERE user_id = (SELECT id FROM users WHERE email = ?) AND day BETWEEN ? AND ?",
+                (email, start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT))).fetchall()
+        return build_trend(buckets, start, end, granularity)
+
+    def rescore_attempts(self, results, model_name):
+        keys = list(results)
+        with self.transaction() as conn:
+            rows = conn.execute(f"SELECT id, user_id, day, accuracy, audio_key FROM attempts "
+                                f"WHERE audio_key IN ({', '.join('?' * len(keys))})", keys).fetchall()
+            changed_days = {}
+            for attempt_id, user_id, day, old_accuracy, key in rows:
+                spoken_word, accuracy = results[key]
+                conn.execute("UPDATE attempts SET accuracy = ?, spoken_word = ? WHERE id = ?",
+                             (accuracy, spoken_word, attempt_id))
+                if accuracy != old_accuracy:
+                    changed_days[(user_id, day)] = changed_days.get((user_id, day), 0) + accuracy - old_accuracy
+            # In the same transaction, so the best comes from the day's attempts as they are now
+            conn.executemany("UPDATE score_history SET accuracy_sum = accuracy_sum + ?, best_accuracy = "
+                             "(SELECT MAX(accuracy) FROM attempts WHERE user_id = ? AND day = ?) "
+                             "WHERE user_id = ? AND day = ?",
+                             [(round(difference, 2), user_id, day, user_id, day)
+                              for (user_id, day), difference in changed_days.items()])
+        return len(rows)
+
+    def stats(self):
+        with self.lock:
+            return {"backend": self.name, "path": self.path, "connections": self.opened,
+                    "pool_size": self.pool_size, "idle": self.pool.qsize(), "waits": self.waits}
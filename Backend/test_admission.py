@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+def hold_slot(controller, release, priority="interactive"):
+    def run():
+        with controller.admit(priority):
+            release.wait()
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=2):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.005)
+
+
+def test_overflow_is_rejected_with_retry_after():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait=2)
+    release = threading.Event()
+    threads = [hold_slot(controller, release), hold_slot(controller, release)]
+    wait_for(lambda: controller.stats()["queued"] == 1)
+
+    with pytest.raises(Overloaded) as error:
+        with controller.admit():
+            pass
+    assert error.value.retry_after >= 1
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    stats = controller.stats()
+    assert stats["admitted"]["interactive"] == 2
+    assert stats["rejected"]["interactive"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_interactive_is_admitted_before_batch():
+    controller = AdmissionController(max_concurrent=1, max_queue=4, max_wait=2)
+    release = threading.Event()
+    order = []
+    blocker = hold_slot(controller, release)
+
+    def queued(priority):
+        with controller.admit(priority):
+            order.append(priority)
+
+    waiting = [threading.Thread(target=queued, args=("batch",))]
+    waiting[0].start()
+    wait_for(lambda: controller.stats()["queued"] == 1)
+    waiting.append(threading.Thread(target=queued, args=("interactive",)))
+    waiting[1].start()
+    wait_for(lambda: controller.stats()["queued"] == 2)
+
+    release.set()
+    for thread in [blocker] + waiting:
+        thread.join()
+    assert order == ["interactive", "batch"]
+
+
+def test_batch_share_and_queue_timeout():
+    controller = AdmissionController(max_concurrent=1, max_queue=2, max_wait=0.05, batch_queue_share=0.5)
+    release = threading.Event()
+    blocker = hold_slot(controller, release)
+    wait_for(lambda: controller.stats()["in_flight"] == 1)
+
+    # Nobody frees the slot, so the waiter gives up after max_wait
+    started = time.monotonic()
+    with pytest.raises(Overloaded):
+        with controller.admit("batch"):
+            pass
+    assert time.monotonic() - started < 1
+
+    release.set()
+    blocker.join()
+    assert controller.stats()["queued"] == 0
@@ -1,31 +1,83 @@
+import io
+import gzip
+import json
 import os
 import sys
 import pytest
 import mongomock
 from unittest.mock import patch, MagicMock
-from flask import Flask
+from flask import current_app
+from werkzeug.security import generate_password_hash
 
 # Import the app
-from app import app
+from app import create_app
+from history import record_attempt
+from admission import Overloaded
+from datetime import datetime, timedelta
 
 @pytest.fixture
-def client():
-    """Create a test client for the app."""
-    # Configure the app for testing
-    app.config.update({
+def mock_db():
+    return mongomock.MongoClient().db
+
+
+class FakeModel:
+    def find_word(self, word):
+        return 1
+
+
+class FakeRecognizer:
+    """Stands in for Vosk: every decode hears `text`."""
+
+    def __init__(self, text='pencil'):
+        self.text = text
+        self.waveforms = 0
+        self.decodes = 0
+
+    def AcceptWaveform(self, data):
+        self.waveforms += 1
+        return False
+
+    def FinalResult(self):
+        self.decodes += 1
+        return json.dumps({"text": self.text})
+
+
+# Half a second of a loud square wave, which the voice-activity gate passes as speech
+def speech_clip(period=40):
+    return b''.join((8000 if (i // (period // 2)) % 2 else -8000).to_bytes(2, 'little', signed=True)
+                    for i in range(8000))
+
+
+@pytest.fixture
+def recognizer():
+    return FakeRecognizer()
+
+
+def make_app(config, db=None, recognizer=None):
+    """An app with a fake speech model and recognizer, so tests don't need a Vosk model."""
+    recognizer = recognizer or FakeRecognizer()
+    return create_app(dict({
         "TESTING": True,
-        "MONGO_URI": "mongodb://localhost:27017/testdb",  # Test URI
-        "SECRET_KEY": "test_secret_key"
-    })
-    
-    # Create a mock MongoDB client and collection
-    mock_db = mongomock.MongoClient().db
-    mock_collection = mock_db.sp1
-    
+        "SECRET_KEY": "test_secret_key",
+        "LOGIN_HASH_WORKERS": 0,  # check passwords on the request thread
+        "VOCABULARY_CHECK_MODEL": False
+    }, **config), db=db, model_loader=lambda path: FakeModel(),
+        recognizer_factory=lambda model, sample_rate: recognizer)
+
+
+@pytest.fixture
+def app(mock_db, recognizer):
+    """A fresh app per test, backed by mongomock instead of MongoDB."""
+    return make_app({"MONGO_URI": "mongodb://localhost:27017/testdb"}, db=mock_db, recognizer=recognizer)
+
+
+@pytest.fixture
+def client(app, mock_db):
+    """Create a test client for the app."""
     # Add a test user to the mocked collection
     test_user = {
         "email": "test@example.com",
-        "password": "hashed_password",  # This would be a hashed password in reality
+        "password": generate_password_hash("password123"),
         "name": "Test User",
         "custom_words": [],
         "selected_sounds": ["p", "b"],
@@ -33,27 +85,23 @@ def client():
         "level": 1,
         "scores": []
     }
-    mock_collection.insert_one(test_user)
-    
-    # Patch the global collection reference in the app module
-    with patch('app.collection', mock_collection):
-        # Create a test client
-        with app.test_client() as testing_client:
-            # Create app context for testing
-            with app.app_context():
-                yield testing_client
+    mock_db.sp1.insert_one(test_user)
+
+    # Create a test client
+    with app.test_client() as testing_client:
+        # Create app context for testing
+        with app.app_context():
+            yield testing_client
 
 def test_login(client):
-    # Mock check_password_hash to always return True for testing
-    with patch('app.check_password_hash', return_value=True):
-        response = client.post('/login', json={
-            "email": "test@example.com",
-            "password": "password123"
-        })
-        assert response.status_code == 200
-        data = response.get_json()
-        assert "message" in data
-        assert data["message"] == "Login successful"
+    response = client.post('/login', json={
+        "email": "test@example.com",
+        "password": "password123"
+    })
+    assert response.status_code == 200
+    data = response.get_json()
+    assert "message" in data
+    assert data["message"] == "Login successful"
 
 def test_get_target_word(client):
     # Set user_email in session
@@ -105,18 +153,29 @@ def test_add_custom_word(client):
 
 # Add these test functions to your existing test_app.py file
 
+def test_login_token_authenticates_without_session(client, app):
+    """Test that the token from /login works in place of the session cookie"""
+    token = client.post('/login', json={"email": "test@example.com", "password": "password123"}).get_json()["token"]
+
+    with app.test_client() as other:  # no session cookie
+        assert other.get('/get-target-word').status_code == 401
+        response = other.get('/get-target-word', headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        assert other.get('/get-target-word', headers={"Authorization": "Bearer " + token[:-2]}).status_code == 401
+
+    assert client.get('/metrics').get_json()["login"]["checks"] == 1
+
+
 def test_login_invalid_credentials(client):
     """Test login with invalid password"""
-    # Mock check_password_hash to return False (invalid password)
-    with patch('app.check_password_hash', return_value=False):
-        response = client.post('/login', json={
-            "email": "test@example.com",
-            "password": "wrong_password"
-        })
-        assert response.status_code == 401
-        data = response.get_json()
-        assert "message" in data
-        assert data["message"] == "Invalid password"
+    response = client.post('/login', json={
+        "email": "test@example.com",
+        "password": "wrong_password"
+    })
+    assert response.status_code == 401
+    data = response.get_json()
+    assert "message" in data
+    assert data["message"] == "Invalid password"
 
 def test_login_user_not_found(client):
     """Test login with non-existent user"""
@@ -223,4 +282,386 @@ def test_register_missing_fields(client):
     assert response.status_code == 400
     data = response.get_json()
     assert "error" in data
-    assert "required" in data["error"].lower()
\ No newline at end of file
+    assert "required" in data["error"].lower()
+
+def test_speech_to_text_retry_uses_cache(client, recognizer):
+    """Test that retrying the same upload returns the cached transcript without decoding"""
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+
+    for _ in range(2):
+        response = client.post('/speech-to-text', data={
+            'audio': (io.BytesIO(speech_clip()), 'retry.wav')
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert response.get_json()['spoken_word'] == 'Pencil'
+
+    assert recognizer.decodes == 1
+    metrics = client.get('/metrics').get_json()
+    assert metrics['recognition_cache']['hits'] >= 1
+
+
+def test_speech_to_text_rejects_long_audio(client, recognizer):
+    """Test that uploads longer than MAX_AUDIO_SECONDS are rejected before decoding"""
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+
+    with patch.dict(current_app.config, {'MAX_AUDIO_SECONDS': 1}):
+        response = client.post('/speech-to-text', data={
+            'audio': (io.BytesIO(b'\x00\x00' * 16000 * 2), 'long.wav')
+        }, content_type='multipart/form-data')
+
+    assert response.status_code == 413
+    assert "second limit" in response.get_json()["error"]
+    assert recognizer.waveforms == 0
+
+
+def test_speech_to_text_rejects_silence(client, recognizer):
+    """Test that a silent recording is rejected by the VAD without being decoded"""
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+
+    response = client.post('/speech-to-text', data={
+        'audio': (io.BytesIO(b'\x00\x00' * 16000), 'silence.wav')
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 422
+    assert "no speech" in response.get_json()["error"].lower()
+    assert recognizer.waveforms == 0
+
+
+def add_leaderboard_users(mock_db):
+    collection = mock_db.sp1
+    collection.insert_many([
+        {"email": "a@example.com", "name": "Ann", "group": "class-1", "total_score": 300, "level": 1},
+        {"email": "b@example.com", "name": "Ben", "group": "class-2", "total_score": 900, "level": 1},
+        {"email": "c@example.com", "name": "Cat", "group": "class-1", "total_score": 500, "level": 1},
+    ])
+    return collection
+
+
+def test_leaderboard_global_and_group(client, mock_db):
+    """Test the leaderboard ordering, group filter and the caller's own rank"""
+    add_leaderboard_users(mock_db)
+    assert client.get('/leaderboard').status_code == 401
+
+    with client.session_transaction() as session:
+        session['user_email'] = 'a@example.com'
+    response = client.get('/leaderboard')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [row["name"] for row in data["leaderboard"]] == ["Ben", "Cat", "Ann", "Test User"]
+    assert data["me"] == {"rank": 3, "total_score": 300}
+
+    data = client.get('/leaderboard?group=class-1').get_json()
+    assert [row["name"] for row in data["leaderboard"]] == ["Cat", "Ann"]
+    assert data["me"]["rank"] == 2
+    assert client.get('/leaderboard?group=class-2').status_code == 403
+
+    assert [row["name"] for row in client.get('/leaderboard?limit=2').get_json()["leaderboard"]] == ["Ben", "Cat"]
+    assert len(client.get('/leaderboard?limit=1000').get_json()["leaderboard"]) == 4
+    assert client.get('/leaderboard?limit=-2').status_code == 400
+    assert client.get('/leaderboard?limit=0').status_code == 400
+    assert client.get('/leaderboard?limit=ten').status_code == 400
+
+
+def test_play_game_updates_cached_leaderboard(client, app, mock_db):
+    """Test that a new score moves the player up the cached leaderboard"""
+    collection = add_leaderboard_users(mock_db)
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+    client.get('/leaderboard')  # load the board into the cache
+
+    collection.update_one({"email": "test@example.com"}, {"$set": {"total_score": 450}})
+    app.extensions['spello'].session_data.update(spoken_word='Pencil', target_word='Pencil', accuracy=100)
+    response = client.post('/play-game')
+    assert response.get_json()['total_score'] == 550
+
+    data = client.get('/leaderboard').get_json()
+    assert [row["name"] for row in data["leaderboard"]][:2] == ["Ben", "Test User"]
+
+
+def test_attempt_recognizes_scores_and_saves_in_one_request(client, app):
+    """Test the combined attempt endpoint against the two-call flow"""
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+    assert client.post('/attempt', data={'audio': (io.BytesIO(b'\x00\x03' * 800), 'a.wav')},
+                       content_type='multipart/form-data').status_code == 400  # no target word yet
+
+    # The client can't pick its own word to be scored against
+    app.extensions['spello'].session_data['target_word'] = 'Ball'
+    response = client.post('/attempt', data={
+        'target_word': 'Pencil', 'audio': (io.BytesIO(speech_clip()), 'attempt.wav')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 409 and response.get_json()['target_word'] == 'Ball'
+
+    app.extensions['spello'].session_data['target_word'] = 'Pencil'
+    response = client.post('/attempt', data={
+        'target_word': 'Pencil', 'audio': (io.BytesIO(speech_clip()), 'attempt.wav')
+    }, content_type='multipart/form-data')
+    state = response.get_json()
+    assert response.status_code == 200
+    assert state['spoken_word'] == 'Pencil' and state['accuracy'] == 100 and state['score'] == 100
+    assert state['attempts'] == 1 and state['lives'] == 5 and state['current_streak'] == 1
+    # The next word is already picked for this user's sounds
+    assert state['next_target_word'] == sys.modules['app'].session_data['target_word']
+    assert state['next_target_word'] in sys.modules['app'].build_word_candidates(['p', 'b'], [])
+
+    user = sys.modules['app'].collection.find_one({"email": "test@example.com"})
+    assert user['total_score'] == 100 and user['attempts'] == 1
+    assert user['scores'][0]['target_word'] == 'Pencil'
+    bucket = sys.modules['app'].history_collection.find_one({"email": "test@example.com"})
+    assert bucket['attempts'] == 1 and bucket['accuracy_sum'] == 100 and bucket['score_sum'] == 100
+
+
+def test_bulk_provisioning_from_roster(client, mock_db):
+    """Test creating users from an uploaded roster"""
+    roster = b"name,email,password\nAna,ana@example.com,pw1\nTest,test@example.com,pw2\n"
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+    assert client.post('/users/bulk', json={"users": [{"name": "Ana"}]}).status_code == 403  # students can't
+
+    mock_db.sp1.update_one({"email": "test@example.com"}, {"$set": {"role": "admin"}})
+    response = client.post('/users/bulk', data={'roster': (io.BytesIO(roster), 'roster.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 201
+    report = response.get_json()
+    assert report["created"] == 1 and report["rows"] == 2
+    assert report["errors"] == [{"row": 2, "email": "test@example.com", "error": "User already exists"}]
+    assert client.post('/users/bulk', json={"users": []}).status_code == 400
+
+
+def test_accuracy_trend_reads_history_buckets(client):
+    """Test the range trend endpoint, including downsampling for long ranges"""
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+
+    today = datetime.now().date()
+    history = sys.modules['app'].history_collection
+    for days_ago, accuracy in [(0, 80), (0, 60), (1, 50), (40, 90)]:
+        day = (today - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+        record_attempt(history, 'test@example.com', day, accuracy, 0)
+
+    data = client.get('/dashboard/trend?range=week').get_json()
+    assert data["granularity"] == "day"
+    assert len(data["trend"]) == 7
+    assert data["trend"][-1] == {"date": today.strftime('%Y-%m-%d'), "average_accuracy": 70, "attempts": 2}
+    assert data["trend"][-2]["attempts"] == 1
+
+    data = client.get('/dashboard/trend?range=term').get_json()
+    assert data["granularity"] == "week"
+    assert sum(point["attempts"] for point in data["trend"]) == 4
+
+    response = client.get('/dashboard/trend?start=2026-13-01')
+    assert response.status_code == 400
+
+    # Custom ranges are capped in span and in points
+    assert client.get('/dashboard/trend?start=1000-01-01&granularity=day').status_code == 400
+    assert client.get('/dashboard/trend?start=1000-01-01').status_code == 400
+    start = (today - timedelta(days=400)).strftime('%Y-%m-%d')
+    assert client.get(f'/dashboard/trend?start={start}&granularity=day').status_code == 400
+    data = client.get(f'/dashboard/trend?start={start}').get_json()
+    assert data["granularity"] == "month" and len(data["trend"]) <= 15
+
+
+def test_export_streams_user_and_cohort_history(client):
+    """Test NDJSON and CSV exports for a user and a cohort"""
+    collection = sys.modules['app'].collection
+    attempt = {"target_word": "Pen", "spoken_word": "Pen", "accuracy": 100, "score": 250, "timestamp": datetime(2024, 1, 2)}
+    collection.insert_many([
+        {"email": "a@example.com", "name": "Ann", "group": "class-1", "scores": [attempt, attempt]},
+        {"email": "c@example.com", "name": "Cat", "group": "class-1", "scores": [attempt]},
+    ])
+    assert client.get('/export?email=a@example.com').status_code == 401
+
+    # A student only gets their own history
+    with client.session_transaction() as session:
+        session['user_email'] = 'c@example.com'
+    assert len(client.get('/export').get_data(as_text=True).splitlines()) == 1
+    assert client.get('/export?email=a@example.com').status_code == 403
+    assert client.get('/export?group=class-1').status_code == 403
+
+    collection.update_one({"email": "test@example.com"}, {"$set": {"role": "teacher", "group": "class-1"}})
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+    response = client.get('/export?email=a@example.com')
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(rows) == 2 and rows[0]["target_word"] == "Pen" and rows[0]["email"] == "a@example.com"
+    assert rows[0]["timestamp"] == "2024-01-02"
+
+    response = client.get('/export?group=class-1&format=csv')
+    assert response.mimetype == 'text/csv'
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('email,name,group') and len(lines) == 4
+    assert client.get('/export?group=class-2').status_code == 403
+
+    assert client.get('/export?email=a@example.com&format=xml').status_code == 400
+    assert client.get('/export?email=nobody@example.com').status_code == 404
+
+
+def test_speech_to_text_overload_returns_503(client, app, recognizer):
+    """Test that a full recognition queue gets a fast 503 with Retry-After"""
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+
+    busy = MagicMock()
+    busy.admit.side_effect = Overloaded(3)
+    with patch.object(app.extensions['spello'], 'admission', busy):
+        response = client.post('/speech-to-text', data={
+            'audio': (io.BytesIO(b'\x00\x02' * 800), 'busy.wav')
+        }, content_type='multipart/form-data')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    assert recognizer.decodes == 0
+
+    response = client.post('/speech-to-text?priority=urgent', data={
+        'audio': (io.BytesIO(b'\x00\x01' * 800), 'busy.wav')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+def test_model_selection(client):
+    """Test listing models and rejecting unknown model choices"""
+    data = client.get('/models').get_json()
+    assert data["default"] in data["models"]
+
+    response = client.post('/update-model', json={"email": "test@example.com", "model": "klingon"})
+    assert response.status_code == 400
+    response = client.post('/update-model', json={"email": "test@example.com", "model": data["default"]})
+    assert response.status_code == 200
+    assert sys.modules['app'].collection.find_one({"email": "test@example.com"})["model"] == data["default"]
+
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+    response = client.post('/speech-to-text?model=klingon', data={
+        'audio': (io.BytesIO(b'\x00\x01' * 800), 'model.wav')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+def test_get_user_is_encoded_and_compressed(client):
+    """Test ObjectId/date encoding and Accept-Encoding negotiated compression"""
+    collection = sys.modules['app'].collection
+    attempt = {"target_word": "Pencil", "spoken_word": "Pencil", "accuracy": 100, "score": 250,
+               "timestamp": datetime(2024, 1, 2)}
+    collection.update_one({"email": "test@example.com"}, {"$set": {"scores": [attempt] * 50}})
+
+    response = client.get('/get_user?email=test@example.com')
+    assert response.headers.get('Content-Encoding') is None
+    user = response.get_json()
+    assert isinstance(user["_id"], str) and user["scores"][0]["timestamp"] == "2024-01-02"
+
+    response = client.get('/get_user?email=test@example.com', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.get_data())) == user
+
+    stats = client.get('/metrics').get_json()["responses"]["get_user"]
+    assert stats["compressed"] >= 1 and stats["avg_sent_bytes"] < stats["avg_raw_bytes"]
+
+
+def test_get_user_fields_and_history_pages(client):
+    """Test ?fields= projection and paging back through attempts newest first"""
+    collection = sys.modules['app'].collection
+    attempts = [{"target_word": f"Word{i}", "accuracy": i, "timestamp": datetime(2024, 1, 2)} for i in range(5)]
+    collection.update_one({"email": "test@example.com"},
+                          {"$set": {"scores": attempts, "archived_summary": {"attempts": 3}}})
+
+    user = client.get('/get_user?email=test@example.com&fields=name,level').get_json()
+    assert set(user) == {"_id", "name", "level"}
+    assert client.get('/get_user?email=test@example.com&fields=password').status_code == 400
+
+    page = client.get('/history?email=test@example.com&limit=2').get_json()
+    assert [(a["id"], a["target_word"]) for a in page["attempts"]] == [(7, "Word4"), (6, "Word3")]
+    assert page["total_attempts"] == 8 and page["next_before"] == 6
+
+    # A new attempt doesn't shift the ids of the next page
+    collection.update_one({"email": "test@example.com"}, {"$push": {"scores": {"target_word": "Word5"}}})
+    page = client.get('/history?email=test@example.com&limit=2&before=6').get_json()
+    assert [a["id"] for a in page["attempts"]] == [5, 4]
+    page = client.get('/history?email=test@example.com&limit=2&before=4').get_json()
+    assert [a["id"] for a in page["attempts"]] == [3] and page["next_before"] is None
+
+    assert client.get('/history?email=test@example.com&limit=0').status_code == 400
+    assert client.get('/history?email=nobody@example.com').status_code == 404
+
+
+def test_difficulty_reads_precomputed_rows(client):
+    """Test the difficulty endpoint ordering and sound filter"""
+    sys.modules['app'].difficulty_collection.insert_many([
+        {"_id": "word:Ball", "kind": "word", "key": "Ball", "sounds": ["b"], "attempts": 4, "mean_accuracy": 80},
+        {"_id": "word:Pencil", "kind": "word", "key": "Pencil", "sounds": ["p"], "attempts": 4, "mean_accuracy": 30},
+        {"_id": "word:Happy", "kind": "word", "key": "Happy", "sounds": ["p", "b"], "attempts": 2, "mean_accuracy": 55},
+    ])
+
+    rows = client.get('/analytics/difficulty').get_json()["difficulty"]
+    assert [row["key"] for row in rows] == ["Pencil", "Happy", "Ball"]
+    rows = client.get('/analytics/difficulty?kind=word&sound=b').get_json()["difficulty"]
+    assert [row["key"] for row in rows] == ["Happy", "Ball"]
+    assert client.get('/analytics/difficulty?kind=letter').status_code == 400
+
+
+def test_create_app_loads_nothing_until_used(mock_db):
+    """Test that models and the database are only touched on first use, or by warmup"""
+    loaded = []
+    recognizer = MagicMock()
+    options = {"model_loader": lambda path: loaded.append(path) or object(),
+               "recognizer_factory": lambda model, sample_rate: recognizer}
+    config = {"TESTING": True, "VOSK_MODELS": {"en": "/models/en"}, "VOCABULARY_CHECK_MODEL": False}
+
+    lazy = create_app({"TESTING": True})
+    assert lazy.extensions['spello']._db is None
+    lazy = create_app(config, db=mock_db, **options)
+    assert loaded == [] and lazy.extensions['spello'].models.stats()["resident_bytes"] == 0
+
+    create_app(dict(config, WARMUP_ASR=True), db=mock_db, **options)
+    assert loaded == ["/models/en"]
+    recognizer.AcceptWaveform.assert_called_once()
+
+
+def test_game_loop_on_sqlite_storage(tmp_path):
+    """Test registering, practising and the dashboard with the embedded SQLite backend"""
+    app = make_app({"STORAGE_BACKEND": "sqlite", "SQLITE_PATH": str(tmp_path / "spello.db")})
+    client = app.test_client()
+    assert client.post('/register', json={"name": "Ana", "email": "ana@example.com", "password": "pw"}).status_code == 201
+    assert client.post('/register', json={"name": "Ana", "email": "ana@example.com", "password": "pw"}).status_code == 409
+    token = client.post('/login', json={"email": "ana@example.com", "password": "pw"}).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.post('/update_selected_sounds', json={"selected_sounds": ["p"]}, headers=headers).status_code == 200
+    app.extensions['spello'].session_data['target_word'] = 'Pencil'
+    state = client.post('/attempt', data={'target_word': 'Pencil', 'audio': (io.BytesIO(speech_clip()), 'a.wav')},
+                        content_type='multipart/form-data', headers=headers).get_json()
+    assert state["score"] == 100 and state["total_score"] == 100
+
+    dashboard = client.get('/dashboard', headers=headers).get_json()
+    assert dashboard["accuracy"] == {"average_accuracy": 100, "total_attempts": 1}
+    assert dashboard["words_mastered"]["list"] == ["Pencil"] and dashboard["weekly_trend"][-1]["attempts"] == 1
+    assert client.get('/leaderboard', headers=headers).status_code == 501
+
+
+def test_attempt_audio_is_archived_under_its_attempt(mock_db, tmp_path):
+    """Test that attempts keep a key to their archived recording when the archive is on"""
+    app = make_app({"AUDIO_ARCHIVE_DIR": str(tmp_path)}, db=mock_db)
+    mock_db.sp1.insert_one({"email": "test@example.com", "name": "Test User", "selected_sounds": ["p"], "scores": []})
+    app.extensions['spello'].session_data['target_word'] = 'Pencil'
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_email'] = 'test@example.com'
+
+    response = client.post('/attempt', data={
+        'target_word': 'Pencil', 'audio': (io.BytesIO(speech_clip()), 'attempt.wav')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+
+    archive = app.extensions['spello'].audio_archive
+    archive.flush()
+    audio_key = mock_db.sp1.find_one({"email": "test@example.com"})['scores'][0]['audio_key']
+    clip_index = os.path.join(str(tmp_path), os.listdir(str(tmp_path))[0], 'index.ndjson')
+    with open(clip_index) as f:
+        entry = json.loads(f.readline())
+    assert entry['key'] == audio_key and entry['email'] == 'test@example.com' and entry['target_word'] == 'Pencil'
+    with app.app_context():
+        assert client.get('/metrics').get_json()['audio_archive']['archived'] == 1
@@ -0,0 +1,125 @@
+import io
+import os
+import wave
+import struct
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from audio_archive import AudioArchive, iter_index, read_clip
+from recognition import np, soundfile
+from rescore import rescore
+from storage import MongoStorage, SqliteStorage
+
+
+def wav_bytes(samples, sample_rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(struct.pack(f'<{len(samples)}h', *samples))
+    return buffer.getvalue()
+
+
+# Half a second of a loud square wave, so the voice-activity gate keeps it
+SPEECH = [8000 if (i // 20) % 2 else -8000 for i in range(8000)]
+
+
+class FakeRecognizer:
+    def __init__(self, text):
+        self.text = text
+
+    def AcceptWaveform(self, data):
+        return False
+
+    def FinalResult(self):
+        return '{"text": "%s"}' % self.text
+
+
+def test_archive_writes_compressed_clips_and_an_index(tmp_path):
+    archive = AudioArchive(str(tmp_path), max_pending=4)
+    assert archive.submit('abc', wav_bytes(SPEECH), email='ana@example.com', target_word='Pencil', model='en-small')
+    assert archive.submit('bad', b'OggS' + b'\x00' * 10, email='ana@example.com', target_word='Ball')
+    archive.flush()
+
+    clips = list(iter_index(str(tmp_path)))
+    assert [clip['key'] for clip in clips] == ['abc']
+    assert clips[0]['target_word'] == 'Pencil' and clips[0]['sample_rate'] == 16000 and clips[0]['seconds'] == 0.5
+    assert read_clip(clips[0]['path']) == struct.pack('<8000h', *SPEECH)
+    assert os.path.getsize(clips[0]['path']) < 16000
+    assert list(iter_index(str(tmp_path), since=datetime(2999, 1, 1))) == []
+
+    stats = archive.stats()
+    assert stats['archived'] == 1 and stats['failed'] == 1 and stats['dropped'] == 0
+    assert 0 < stats['compression_ratio'] < 1
+
+
+@pytest.mark.skipif(soundfile is None, reason="soundfile is not installed")
+def test_archive_keeps_writing_after_a_clip_fails_to_decode(tmp_path):
+    flac = io.BytesIO()
+    soundfile.write(flac, np.array(SPEECH * 2, dtype=np.int16), 16000, format='FLAC')
+    # Valid header, corrupt frames: the decoder only fails part way through
+    corrupt = flac.getvalue()[:len(flac.getvalue()) // 2] + b'\xff' * 4000
+
+    archive = AudioArchive(str(tmp_path))
+    archive.submit('corrupt', corrupt)
+    archive.submit('good', wav_bytes(SPEECH))
+    archive.flush()
+
+    assert archive.thread.is_alive()
+    assert [clip['key'] for clip in iter_index(str(tmp_path))] == ['good']
+    assert archive.stats()['failed'] == 1 and archive.stats()['archived'] == 1
+
+
+def test_archive_drops_clips_when_the_queue_is_full(tmp_path):
+    archive = AudioArchive(str(tmp_path), max_pending=1)
+    archive.close()  # no writer, so the queue stays full
+
+    assert archive.submit('one', wav_bytes(SPEECH))
+    assert not archive.submit('two', wav_bytes(SPEECH))
+    assert archive.stats()['dropped'] == 1 and archive.stats()['pending'] == 1
+
+
+@pytest.fixture(params=['mongo', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'sqlite':
+        return SqliteStorage(str(tmp_path / 'spello.db'))
+    db = mongomock.MongoClient().db
+    return MongoStorage(db.sp1, db.score_history)
+
+
+def test_rescore_updates_accuracies_and_day_buckets(tmp_path, storage):
+    archive = AudioArchive(str(tmp_path / 'archive'))
+    for key in ('k1', 'k2', 'gone'):
+        archive.submit(key, wav_bytes(SPEECH), email='ana@example.com', target_word='Pencil')
+    archive.flush()
+
+    storage.create_user({'email': 'ana@example.com', 'name': 'Ana', 'scores': []})
+    day = datetime(2024, 1, 2)
+    for key, spoken_word, accuracy, score in [('k1', 'Pencil', 100, 100), ('k2', 'Pe', 20, 0)]:
+        storage.append_attempt('ana@example.com', {}, {'target_word': 'Pencil', 'spoken_word': spoken_word,
+                                                       'accuracy': accuracy, 'score': score, 'timestamp': day,
+                                                       'audio_key': key})
+
+    # The new model hears "pen" in both clips, so the day's best goes down
+    progress = []
+    report = rescore(storage, iter_index(str(tmp_path / 'archive')), '/models/en-large',
+                     batch_size=2, progress=lambda report: progress.append(report['clips']),
+                     loader=lambda path: None, factory=lambda model, rate: FakeRecognizer('pen'))
+
+    assert report['clips'] == 3 and report['updated'] == 2 and report['missing'] == 1 and report['failed'] == 0
+    assert report['audio_seconds'] == 1.5 and progress == [2, 3]
+    summary = storage.dashboard('ana@example.com')['summary']
+    assert summary['attempts'] == 2 and summary['accuracy_sum'] == 100 and summary['best_accuracy'] == {'Pencil': 50}
+    trend = storage.read_trend('ana@example.com', day.date(), day.date(), 'day')['trend']
+    assert trend == [{'date': '2024-01-02', 'attempts': 2, 'average_accuracy': 50}]
+    if storage.name == 'mongo':
+        assert storage.history.find_one({'email': 'ana@example.com'})['best_accuracy'] == 50
+        scores = storage.users.find_one({'email': 'ana@example.com'})['scores']
+        assert scores[0]['spoken_word'] == 'Pen' and scores[0]['rescored_model'] == 'en-large'
+        assert scores[0]['score'] == 100  # points already awarded are kept
+    else:
+        with storage.connection() as conn:
+            assert conn.execute("SELECT best_accuracy FROM score_history").fetchone()[0] == 50
@@ -0,0 +1,55 @@
+from concurrent.futures import Future
+
+import pytest
+from bson import ObjectId
+from werkzeug.security import generate_password_hash
+
+from auth import LoginBusy, PasswordVerifier, issue_token, read_token
+
+
+def test_password_verifier_checks_on_worker_processes():
+    verifier = PasswordVerifier(workers=1, max_queue=1)
+    password_hash = generate_password_hash("secret")
+    try:
+        assert verifier.verify(password_hash, "secret")
+        assert not verifier.verify(password_hash, "wrong")
+    finally:
+        verifier.executor.shutdown()
+    assert verifier.stats()["checks"] == 2 and verifier.stats()["in_flight"] == 0
+
+
+def test_password_verifier_turns_away_logins_past_the_queue():
+    verifier = PasswordVerifier(workers=1, max_queue=0)
+    verifier.in_flight = 1  # one check already running
+
+    with pytest.raises(LoginBusy) as busy:
+        verifier.verify("hash", "password")
+    assert busy.value.retry_after >= 1
+    assert verifier.stats()["rejected"] == 1
+
+
+def test_password_verifier_turns_slow_checks_into_login_busy():
+    class StuckPool:
+        def submit(self, *args):
+            return Future()  # never finishes
+
+    verifier = PasswordVerifier(workers=1, max_queue=1, timeout=0.01)
+    verifier.executor = StuckPool()
+    with pytest.raises(LoginBusy):
+        verifier.verify("hash", "password")
+    assert verifier.stats()["timeouts"] == 1 and verifier.stats()["in_flight"] == 0
+
+
+def test_tokens_carry_the_user_and_reject_tampering():
+    user = {"_id": ObjectId(), "email": "ana@example.com", "group": "class-4b", "role": "teacher", "password": "hash"}
+    token = issue_token("secret", user)
+
+    claims = read_token("secret", token, max_age=60)
+    assert claims == {"_id": str(user["_id"]), "email": "ana@example.com", "group": "class-4b", "role": "teacher",
+                      "model": None}
+    assert read_token("other-secret", token, max_age=60) is None
+    # Change a character in the middle of the signature (the last one's low bits are only padding)
+    body, signature = token.rsplit(".", 1)
+    middle = len(signature) // 2
+    tampered = signature[:middle] + ("A" if signature[middle] != "A" else "B") + signature[middle + 1:]
+    assert read_token("secret", f"{body}.{tampered}", max_age=60) is None
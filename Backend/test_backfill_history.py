@@ -0,0 +1,24 @@
+from datetime import datetime
+
+import mongomock
+
+from backfill_history import backfill
+from history import record_attempt
+
+
+def test_backfill_keeps_live_buckets_unless_rebuilding():
+    db = mongomock.MongoClient().db
+    scores = [{"timestamp": datetime(2024, 1, day), "accuracy": accuracy, "score": 0}
+              for day, accuracy in [(1, 50), (1, 70), (2, 90)]]
+    db.sp1.insert_one({"email": "ana@example.com", "scores": scores})
+    # The app already recorded day 2, plus an attempt saved after the scores were read
+    record_attempt(db.score_history, "ana@example.com", datetime(2024, 1, 2), 90, 0)
+    record_attempt(db.score_history, "ana@example.com", datetime(2024, 1, 2), 40, 0)
+
+    assert backfill(db.sp1, db.score_history) == (1, 1)
+    buckets = {bucket["day"].day: bucket for bucket in db.score_history.find()}
+    assert buckets[1]["attempts"] == 2 and buckets[1]["accuracy_sum"] == 120 and buckets[1]["best_accuracy"] == 70
+    assert buckets[2]["attempts"] == 2 and buckets[2]["accuracy_sum"] == 130
+
+    assert backfill(db.sp1, db.score_history, rebuild=True) == (1, 1)
+    assert db.score_history.find_one({"day": datetime(2024, 1, 2)})["attempts"] == 1
@@ -0,0 +1,64 @@
+from datetime import date, datetime
+
+import mongomock
+
+from app import get_accuracy_summary, get_mastered_words
+from compact_history import compact, restore
+from history import as_day
+
+
+def make_user(db):
+    scores = [
+        {'target_word': 'Pencil', 'spoken_word': 'Pencil', 'accuracy': 90, 'score': 225, 'timestamp': datetime(2024, 1, 2)},
+        {'target_word': 'Ball', 'spoken_word': 'Bat', 'accuracy': 40, 'score': 100, 'timestamp': '2024-01-02'},
+        {'target_word': 'Pen', 'spoken_word': 'Pen', 'accuracy': 80, 'score': 200, 'timestamp': datetime(2024, 3, 1)},
+    ]
+    db.sp1.insert_one({'email': 'student@example.com', 'name': 'Student', 'scores': scores})
+    return scores
+
+
+def test_compact_keeps_summary_exact(tmp_path):
+    db = mongomock.MongoClient().db
+    scores = make_user(db)
+    before = db.sp1.find_one({'email': 'student@example.com'})
+
+    report = compact(db.sp1, db.score_history, str(tmp_path), date(2024, 2, 1))
+
+    user = db.sp1.find_one({'email': 'student@example.com'})
+    assert [score['target_word'] for score in user['scores']] == ['Pen']
+    assert report['attempts'] == 2 and report['bytes_reclaimed'] > 0
+    assert len(report['archives']) == 1
+
+    # Averages and mastery match what the uncompacted document gave
+    assert get_accuracy_summary(user) == get_accuracy_summary(before)
+    assert sorted(get_mastered_words(user['scores'], user['archived_summary'])) == \
+        sorted(get_mastered_words(scores))
+
+    bucket = db.score_history.find_one({'email': 'student@example.com', 'day': datetime(2024, 1, 2)})
+    assert bucket['attempts'] == 2 and bucket['best_accuracy'] == 90
+
+
+def test_dry_run_writes_nothing(tmp_path):
+    db = mongomock.MongoClient().db
+    make_user(db)
+
+    report = compact(db.sp1, db.score_history, str(tmp_path), date(2024, 2, 1), dry_run=True)
+
+    assert report['attempts'] == 2
+    assert len(db.sp1.find_one({'email': 'student@example.com'})['scores']) == 3
+    assert not list(tmp_path.iterdir())
+
+
+def test_restore_puts_attempts_back(tmp_path):
+    db = mongomock.MongoClient().db
+    scores = make_user(db)
+    compact(db.sp1, db.score_history, str(tmp_path), date(2024, 2, 1))
+
+    assert restore(db.sp1, str(tmp_path), 'student@example.com') == 2
+
+    # Restored attempts come back with native dates, including ones archived before the migration
+    user = db.sp1.find_one({'email': 'student@example.com'})
+    assert user['scores'] == [dict(score, timestamp=as_day(score['timestamp'])) for score in scores]
+    assert 'archived_summary' not in user
+    # Archives are only restored once
+    assert restore(db.sp1, str(tmp_path), 'student@example.com') == 0
@@ -0,0 +1,17 @@
+import compression
+from compression import choose_encoding, parse_accept_encoding
+
+
+def test_accept_encoding_negotiation(monkeypatch):
+    assert parse_accept_encoding("gzip;q=0.5, br") == {"gzip": 0.5, "br": 1.0}
+    assert choose_encoding(None) is None
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("*") in ("br", "gzip")
+
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br") is None
@@ -0,0 +1,62 @@
+import io
+from datetime import date, datetime
+
+import mongomock
+import pytest
+
+import export
+from compact_history import compact
+
+
+def make_cohort(size=3, attempts=120):
+    collection = mongomock.MongoClient().db.sp1
+    attempt = {"target_word": "Ball", "spoken_word": "Bat", "accuracy": 40, "score": 100, "timestamp": datetime(2024, 1, 2)}
+    collection.insert_many([
+        {"email": f"s{i}@example.com", "name": f"S{i}", "group": "class-1", "scores": [attempt] * attempts}
+        for i in range(size)
+    ])
+    return collection
+
+
+def test_cohort_export_reads_every_user(monkeypatch):
+    monkeypatch.setattr(export, "CURSOR_BATCH_SIZE", 50)
+    rows = list(export.iter_cohort_attempts(make_cohort(), "class-1", workers=2))
+
+    assert len(rows) == 3 * 120
+    assert {row["email"] for row in rows} == {"s0@example.com", "s1@example.com", "s2@example.com"}
+
+
+def test_cohort_export_raises_reader_errors():
+    collection = make_cohort(size=1)
+    collection.aggregate = None  # every per-user read fails
+
+    with pytest.raises(TypeError):
+        list(export.iter_cohort_attempts(collection, "class-1"))
+
+
+@pytest.mark.skipif(export.pyarrow is None, reason="pyarrow is not installed")
+def test_parquet_export_round_trips():
+    rows = export.iter_user_attempts(make_cohort(size=1), "s0@example.com")
+    data = b''.join(export.to_parquet(rows, row_group=50))
+
+    table = export.pyarrow.parquet.read_table(io.BytesIO(data))
+    assert table.num_rows == 120
+    assert table.column("accuracy").to_pylist()[0] == 40.0
+    assert table.column("timestamp").to_pylist()[0] == datetime(2024, 1, 2)
+
+
+def test_user_export_includes_archived_attempts(tmp_path):
+    db = mongomock.MongoClient().db
+    db.sp1.insert_one({"email": "s0@example.com", "name": "S0", "group": "class-1", "scores": [
+        {"target_word": "Ball", "spoken_word": "Bat", "accuracy": 40, "score": 100, "timestamp": datetime(2024, 1, 2, 9, 30)},
+        {"target_word": "Pen", "spoken_word": "Pen", "accuracy": 80, "score": 200, "timestamp": datetime(2024, 3, 1)},
+    ]})
+    compact(db.sp1, db.score_history, str(tmp_path), date(2024, 2, 1))
+
+    rows = list(export.iter_user_attempts(db.sp1, "s0@example.com", str(tmp_path)))
+    assert [row["target_word"] for row in rows] == ["Ball", "Pen"]
+    assert rows[0]["timestamp"] == datetime(2024, 1, 2, 9, 30)
+    assert rows[0]["group"] == "class-1"
+
+    # Without the archive only the attempts left in the document are exported
+    assert [row["target_word"] for row in export.iter_user_attempts(db.sp1, "s0@example.com")] == ["Pen"]
@@ -0,0 +1,30 @@
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from flask import Flask, g
+
+import json_provider
+from json_provider import SpelloJSONEncoder
+
+
+@pytest.mark.skipif(json_provider.orjson is None, reason="orjson is not installed")
+def test_encoder_class_uses_orjson_and_records_encode_time(monkeypatch):
+    calls = []
+    orjson_dumps = json_provider.orjson.dumps
+
+    def counting_dumps(*args, **kwargs):
+        calls.append(1)
+        return orjson_dumps(*args, **kwargs)
+
+    monkeypatch.setattr(json_provider.orjson, "dumps", counting_dumps)
+    doc = {"_id": ObjectId("0123456789abcdef01234567"), "day": datetime(2024, 1, 2), "at": datetime(2024, 1, 2, 9, 30)}
+
+    # What Flask < 2.2 does in jsonify: json.dumps with the app's encoder class
+    with Flask(__name__).test_request_context():
+        encoded = json.dumps(doc, cls=SpelloJSONEncoder)
+        assert g.json_encode_seconds > 0
+
+    assert calls == [1]
+    assert json.loads(encoded) == {"_id": "0123456789abcdef01234567", "day": "2024-01-02", "at": "2024-01-02T09:30:00"}
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import mongomock
+
+from history import read_trend, record_attempt
+from migrate_timestamps import migrate_buckets, migrate_users
+
+
+def test_user_dates_become_native():
+    users = mongomock.MongoClient().db.sp1
+    users.insert_many([
+        {"email": "a@example.com", "last_practice_date": "2024-01-03", "scores": [
+            {"target_word": "Pen", "accuracy": 80, "timestamp": "2024-01-02"},
+            {"target_word": "Cat", "accuracy": 60, "timestamp": datetime(2024, 1, 3)},
+        ]},
+        {"email": "b@example.com", "last_practice_date": "", "scores": []},
+    ])
+
+    assert migrate_users(users) == (2, 0)
+
+    user = users.find_one({"email": "a@example.com"})
+    assert [score["timestamp"] for score in user["scores"]] == [datetime(2024, 1, 2), datetime(2024, 1, 3)]
+    assert user["last_practice_date"] == datetime(2024, 1, 3)
+    assert users.find_one({"email": "b@example.com"})["last_practice_date"] is None
+    assert migrate_users(users) == (0, 0)
+
+
+def test_string_buckets_are_converted_or_merged():
+    history = mongomock.MongoClient().db.score_history
+    history.insert_many([
+        {"email": "a@example.com", "day": "2024-01-02", "attempts": 2, "accuracy_sum": 100, "score_sum": 0,
+         "best_accuracy": 70},
+        {"email": "a@example.com", "day": "2024-01-03", "attempts": 1, "accuracy_sum": 40, "score_sum": 0,
+         "best_accuracy": 40},
+    ])
+    # An attempt recorded after the deploy but before the migration ran
+    record_attempt(history, "a@example.com", datetime(2024, 1, 3), 90, 0)
+
+    # Reads see both forms while the migration is pending
+    trend = read_trend(history, "a@example.com", datetime(2024, 1, 2).date(), datetime(2024, 1, 3).date())["trend"]
+    assert [point["attempts"] for point in trend] == [2, 2]
+
+    assert migrate_buckets(history) == (1, 1)
+
+    bucket = history.find_one({"email": "a@example.com", "day": datetime(2024, 1, 3)})
+    assert bucket["attempts"] == 2 and bucket["accuracy_sum"] == 130 and bucket["best_accuracy"] == 90
+    assert history.count_documents({"day": {"$type": "string"}}) == 0
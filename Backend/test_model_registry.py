@@ -0,0 +1,47 @@
+import pytest
+
+import model_registry
+from model_registry import ModelRegistry, UnknownModel
+
+
+@pytest.fixture
+def model_dirs(tmp_path, monkeypatch):
+    # No RSS readings, so each model counts as its size on disk
+    monkeypatch.setattr(model_registry, "current_rss_bytes", lambda: 0)
+    paths = {}
+    for key, size in [("en-small", 100), ("en-large", 300), ("fr", 100)]:
+        directory = tmp_path / key
+        directory.mkdir()
+        (directory / "final.mdl").write_bytes(b"\0" * size)
+        paths[key] = str(directory)
+    return paths
+
+
+def test_models_load_lazily_and_are_shared(model_dirs):
+    loads = []
+    registry = ModelRegistry(model_dirs, "en-small", loader=lambda path: loads.append(path) or object())
+
+    assert loads == []
+    first = registry.get()
+    assert registry.get("en-small") is first
+    assert loads == [model_dirs["en-small"]]
+
+    stats = registry.stats()["models"]["en-small"]
+    assert stats["loaded"] and stats["loads"] == 1 and stats["resident_bytes"] == 100
+
+    with pytest.raises(UnknownModel):
+        registry.get("de")
+
+
+def test_least_recently_used_model_is_evicted_over_budget(model_dirs):
+    registry = ModelRegistry(model_dirs, "en-small", memory_budget=450, loader=lambda path: object())
+
+    registry.get("en-small")
+    registry.get("fr")
+    registry.get("en-small")  # fr is now the least recently used
+    registry.get("en-large")
+
+    assert list(registry.loaded) == ["en-small", "en-large"]
+    stats = registry.stats()
+    assert stats["models"]["fr"]["evictions"] == 1
+    assert stats["resident_bytes"] == 400
@@ -0,0 +1,49 @@
+import mongomock
+import pytest
+from werkzeug.security import check_password_hash
+
+import provisioning
+from provisioning import ProvisioningError, ensure_unique_email_index, provision, read_roster
+
+ROSTER = (
+    "Name,Email,Password,Group\n"
+    "Ana,ana@example.com,secret1,class-4b\n"
+    "Ben,,secret2,class-4b\n"
+    "Cara,cara@example.com,secret3,class-4b\n"
+    "Ana again,ana@example.com,secret4,class-4b\n"
+    "Dev,dev@example.com,secret5,class-4b\n"
+)
+
+
+def test_provision_creates_users_and_reports_row_errors():
+    users = mongomock.MongoClient().db.sp1
+    users.insert_one({"email": "dev@example.com", "name": "Existing"})
+
+    report = provision(users, read_roster(ROSTER.encode('utf-8')), workers=1)
+
+    assert report["created"] == 2
+    assert [(error["row"], error["error"]) for error in report["errors"]] == [
+        (2, "Missing email"), (4, "User already exists"), (5, "User already exists")]
+    ana = users.find_one({"email": "ana@example.com"})
+    assert ana["group"] == "class-4b" and ana["lives"] == 5 and ana["scores"] == []
+    assert check_password_hash(ana["password"], "secret1")
+    assert users.find_one({"email": "dev@example.com"})["name"] == "Existing"
+
+
+def test_passwords_are_hashed_in_worker_processes(monkeypatch):
+    monkeypatch.setattr(provisioning, 'MIN_PARALLEL', 2)
+    hashed = provisioning.hash_passwords(["one", "two", "three"], workers=2)
+    assert [check_password_hash(value, password) for value, password in zip(hashed, ["one", "two", "three"])] == [True] * 3
+
+
+def test_unique_email_index_replaces_plain_index_unless_duplicates_exist():
+    users = mongomock.MongoClient().db.sp1
+    users.create_index([("email", 1)])
+    ensure_unique_email_index(users)
+    assert users.index_information()["email_1"]["unique"]
+
+    users = mongomock.MongoClient().db.sp2
+    users.insert_many([{"email": "same@example.com"}, {"email": "same@example.com"}])
+    with pytest.raises(ProvisioningError):
+        ensure_unique_email_index(users)
+    assert "email_1" in users.index_information()
@@ -0,0 +1,140 @@
+import io
+import time
+import wave
+
+import pytest
+
+from recognition import (AudioError, RecognizerPool, TranscriptCache, np, peek_format, read_pcm_chunks, scan_audio,
+                         soundfile, transcribe)
+
+
+def make_wav(pcm, sample_rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def test_cache_key_depends_on_audio_and_config():
+    def key(audio, **config):
+        return scan_audio(io.BytesIO(audio), max_seconds=5, **config).cache_key
+
+    pcm = b'\x10\x00' * 400
+    small = key(make_wav(pcm), model='small')
+    # Same samples with the same configuration hash the same, header or not
+    assert small == key(pcm, model='small')
+    assert small != key(pcm, model='large')
+    assert small != key(pcm, model='small', grammar=['pencil'])
+    assert small != key(make_wav(pcm, 8000), model='small')
+    assert small != key(b'\x11\x00' * 400, model='small')
+
+
+def test_cache_evicts_least_recently_used():
+    entry_size = 32 + len('Pencil') + TranscriptCache.ENTRY_OVERHEAD
+    cache = TranscriptCache(max_bytes=entry_size * 2)
+    cache.put('a' * 32, 'Pencil')
+    cache.put('b' * 32, 'Pencil')
+    assert cache.get('a' * 32) == 'Pencil'  # 'a' is now the most recently used
+    cache.put('c' * 32, 'Pencil')
+
+    assert cache.get('b' * 32) is None
+    assert cache.get('a' * 32) == 'Pencil'
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == round(2 / 3, 4)
+
+
+class FakeRecognizer:
+    def __init__(self):
+        self.fed = 0
+
+    def AcceptWaveform(self, chunk):
+        self.fed += len(chunk)
+        return False
+
+    def Result(self):
+        return '{"text": ""}'
+
+    def FinalResult(self):
+        return '{"text": "pen"}' if self.fed else '{"text": ""}'
+
+
+def test_scan_audio_enforces_duration_limit():
+    pcm = b'\x00\x00' * 8000 * 3
+    info = scan_audio(io.BytesIO(make_wav(pcm, 8000)), max_seconds=5)
+    assert info.sample_rate == 8000
+    assert info.seconds == 3
+    assert info.cache_key == scan_audio(io.BytesIO(make_wav(pcm, 8000)), max_seconds=5).cache_key
+
+    with pytest.raises(AudioError) as error:
+        scan_audio(io.BytesIO(make_wav(pcm, 8000)), max_seconds=2)
+    assert error.value.status_code == 413
+
+
+def test_transcribe_streams_chunks_and_stops_at_deadline():
+    _, chunks = read_pcm_chunks(io.BytesIO(b'\x00\x00' * 16000))
+    recognizer = FakeRecognizer()
+    assert transcribe(recognizer, chunks) == ('Pen', True)
+    assert recognizer.fed == 32000
+
+    _, chunks = read_pcm_chunks(io.BytesIO(b'\x00\x00' * 16000))
+    recognizer = FakeRecognizer()
+    assert transcribe(recognizer, chunks, deadline=time.monotonic() - 1) == ('', False)
+    assert recognizer.fed == 0
+
+
+@pytest.mark.skipif(soundfile is None, reason="soundfile is not installed")
+def test_flac_upload_is_decoded_to_mono_pcm():
+    stereo = np.column_stack([np.full(16000, 1000, dtype=np.int16), np.full(16000, 3000, dtype=np.int16)])
+    flac = io.BytesIO()
+    soundfile.write(flac, stereo, 16000, format='FLAC')
+
+    assert peek_format(flac) == 'flac'
+    info = scan_audio(flac, max_seconds=5)
+    assert info.seconds == 1
+    sample_rate, chunks = read_pcm_chunks(flac)
+    pcm = b''.join(chunks)
+    assert sample_rate == 16000
+    assert len(pcm) == 32000
+    assert set(np.frombuffer(pcm, dtype=np.int16)) == {2000}
+
+    with pytest.raises(AudioError):
+        scan_audio(flac, max_seconds=0.5)
+
+
+@pytest.mark.skipif(soundfile is None, reason="soundfile is not installed")
+def test_flac_with_a_corrupt_body_is_rejected():
+    noise = (np.random.default_rng(0).standard_normal(16000) * 3000).astype(np.int16)
+    flac = io.BytesIO()
+    soundfile.write(flac, noise, 16000, format='FLAC')
+    # The header opens fine; the decoder loses sync in the frames
+    corrupt = io.BytesIO(flac.getvalue()[:len(flac.getvalue()) // 2] + b'\xff' * 4000)
+
+    _, chunks = read_pcm_chunks(corrupt)
+    with pytest.raises(AudioError) as error:
+        b''.join(chunks)
+    assert error.value.status_code == 415
+
+
+def test_recognizer_pool_hands_out_prefetched_recognizers_once():
+    models = {"en": object()}
+    created = []
+    pool = RecognizerPool(models.__getitem__, lambda model, rate: created.append((model, rate)) or object(), size=1)
+
+    assert pool.prefetch("en", 16000)
+    pool.executor.shutdown(wait=True)
+    assert not pool.prefetch("en", 16000)  # already full
+    prefetched = pool.take("en", 16000)
+    assert len(created) == 1 and pool.stats()["hits"] == 1
+
+    # Nothing ready any more, and a reloaded model doesn't reuse old recognizers
+    assert pool.take("en", 16000) is not prefetched
+    pool.ready[("en", 16000)] = [(object(), prefetched)]
+    assert pool.take("en", 16000) is not prefetched
+    assert pool.stats()["misses"] == 2
@@ -0,0 +1,92 @@
+import sqlite3
+from datetime import date, datetime
+
+import mongomock
+import pytest
+
+from backfill_history import backfill
+from storage import DuplicateUser, MongoStorage, SqliteStorage
+
+
+@pytest.fixture(params=['mongo', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'sqlite':
+        return SqliteStorage(str(tmp_path / 'spello.db'), pool_size=2)
+    db = mongomock.MongoClient().db
+    db.sp1.create_index([("email", 1)], unique=True)
+    return MongoStorage(db.sp1, db.score_history)
+
+
+def attempt(word, accuracy, day):
+    return {'target_word': word, 'spoken_word': word, 'accuracy': accuracy, 'score': 100 if accuracy > 75 else 0,
+            'timestamp': datetime(2024, 1, day)}
+
+
+def test_users_are_created_found_and_updated(storage):
+    user_id = storage.create_user({'email': 'ana@example.com', 'name': 'Ana', 'password': 'hash', 'custom_words': [],
+                                   'scores': [], 'last_practice_date': None})
+    with pytest.raises(DuplicateUser):
+        storage.create_user({'email': 'ana@example.com', 'name': 'Again'})
+
+    user = storage.find_user('ana@example.com')
+    assert user['_id'] == user_id and user['name'] == 'Ana' and 'scores' not in user
+    assert storage.find_user('ana@example.com', ['custom_words']) == {'_id': user_id, 'custom_words': []}
+    assert storage.find_user('nobody@example.com') is None
+
+    assert storage.update_user('ana@example.com', {'custom_words': ['Zebra']}) == (True, True)
+    assert storage.update_user('ana@example.com', {'custom_words': ['Zebra']}) == (True, False)
+    assert storage.update_user('nobody@example.com', {'level': 2}) == (False, False)
+    assert storage.find_user('ana@example.com')['custom_words'] == ['Zebra']
+
+
+def test_attempts_feed_the_dashboard_summary_and_trend(storage):
+    storage.create_user({'email': 'ana@example.com', 'name': 'Ana', 'password': 'hash', 'scores': []})
+    for word, accuracy, day in [('Pencil', 50, 1), ('Pencil', 90, 2), ('Ball', 80, 2), ('Cup', 40, 3)]:
+        storage.append_attempt('ana@example.com', {'total_score': 100, 'last_practice_date': datetime(2024, 1, day)},
+                               attempt(word, accuracy, day))
+
+    user = storage.dashboard('ana@example.com')
+    assert 'password' not in user and user['total_score'] == 100
+    assert user['last_practice_date'] == datetime(2024, 1, 3)
+    summary = user['summary']
+    assert summary['attempts'] == 4 and summary['accuracy_sum'] == 260
+    assert summary['best_accuracy'] == {'Pencil': 90, 'Ball': 80, 'Cup': 40}
+    assert storage.dashboard('nobody@example.com') is None
+
+    trend = storage.read_trend('ana@example.com', date(2024, 1, 1), date(2024, 1, 4), 'day')['trend']
+    assert [(point['date'], point['attempts'], point['average_accuracy']) for point in trend] == [
+        ('2024-01-01', 1, 50), ('2024-01-02', 2, 85), ('2024-01-03', 1, 40), ('2024-01-04', 0, 0)]
+
+
+def test_mongo_dashboard_keeps_best_word_accuracies_on_the_user():
+    db = mongomock.MongoClient().db
+    storage = MongoStorage(db.sp1, db.score_history)
+    # A user from before the map was kept, with compacted attempts
+    db.sp1.insert_one({'email': 'ana@example.com', 'name': 'Ana', 'scores': [attempt('Cup', 40, 1), attempt('Pen', 60, 1)],
+                       'archived_summary': {'attempts': 2, 'best_accuracy': {'Ball': 95, 'Pen': 50}}})
+    assert storage.dashboard('ana@example.com')['summary']['best_accuracy'] == {'Ball': 95, 'Pen': 60, 'Cup': 40}
+
+    backfill(db.sp1, db.score_history)
+    for word, accuracy, day in [('Pen', 80, 2), ('', 10, 2), ('Ball', 70, 3), ('U.S.', 90, 3)]:
+        storage.append_attempt('ana@example.com', {}, attempt(word, accuracy, day))
+    db.sp1.update_one({'email': 'ana@example.com'}, {'$unset': {'scores': ''}})  # the dashboard no longer reads them
+
+    user = storage.dashboard('ana@example.com')
+    assert 'word_best_accuracy' not in user and 'archived_summary' not in user
+    assert user['summary']['best_accuracy'] == {'Ball': 95, 'Pen': 80, 'Cup': 40, 'U.S.': 90}
+    assert user['summary']['attempts'] == 6
+
+
+def test_sqlite_files_without_audio_keys_are_migrated(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT NOT NULL UNIQUE, profile TEXT NOT NULL);"
+                       "CREATE TABLE attempts (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, target_word TEXT, "
+                       "spoken_word TEXT, accuracy REAL NOT NULL, score REAL NOT NULL, day TEXT NOT NULL);")
+    conn.close()
+
+    storage = SqliteStorage(path)
+    storage.create_user({'email': 'ana@example.com', 'name': 'Ana'})
+    storage.append_attempt('ana@example.com', {}, dict(attempt('Pencil', 50, 1), audio_key='k1'))
+    assert storage.rescore_attempts({'k1': ('Pencil', 100), 'gone': ('Pen', 50)}, 'en-large') == 1
+    assert storage.dashboard('ana@example.com')['summary']['best_accuracy'] == {'Pencil': 100}
@@ -0,0 +1,52 @@
+import pytest
+
+from recognition import AudioError, np
+from vad import EnergyGate
+
+pytestmark = pytest.mark.skipif(np is None, reason="numpy is not installed")
+
+RATE = 16000
+
+
+def pcm(*segments):
+    # Each segment is (seconds, amplitude) of a 220Hz tone; amplitude 0 is silence
+    parts = []
+    for seconds, amplitude in segments:
+        t = np.arange(int(seconds * RATE)) / RATE
+        parts.append(np.clip(amplitude * np.sin(2 * np.pi * 220 * t), -32768, 32767).astype('<i2'))
+    return np.concatenate(parts).tobytes()
+
+
+def chunked(data, size=8000):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_gate_trims_leading_and_trailing_silence():
+    gate = EnergyGate(RATE)
+    audio = pcm((2, 0), (0.5, 8000), (2, 0))
+    kept = b''.join(gate.filter(chunked(audio)))
+
+    # The speech plus at most 200ms of padding on each side is decoded
+    assert 0.5 * RATE * 2 <= len(kept) <= 0.9 * RATE * 2
+    assert gate.speech_ratio == pytest.approx(0.5 / 4.5, abs=0.02)
+
+
+def test_gate_rejects_silence_without_decoding():
+    gate = EnergyGate(RATE)
+    fed = []
+    with pytest.raises(AudioError) as error:
+        for chunk in gate.filter(chunked(pcm((3, 0)))):
+            fed.append(chunk)
+    assert error.value.status_code == 422
+    assert "no speech" in str(error.value).lower()
+    assert fed == []
+
+
+def test_gate_rejects_clipping_before_decoding():
+    gate = EnergyGate(RATE)
+    fed = []
+    with pytest.raises(AudioError) as error:
+        for chunk in gate.filter(chunked(pcm((0.5, 0), (2, 40000)))):
+            fed.append(chunk)
+    assert "clipped" in str(error.value)
+    assert fed == []
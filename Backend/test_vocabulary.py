@@ -0,0 +1,82 @@
+import json
+import os
+import time
+import threading
+
+import mongomock
+import pytest
+
+from vocabulary import CollectionSource, FileSource, Vocabulary, VocabularyError, VocabularyStore
+
+
+def write_vocabulary(path, version, sounds):
+    path.write_text(json.dumps({"version": version, "sounds": sounds}))
+    # Make sure the change is visible even on filesystems with coarse mtimes
+    os.utime(path, ns=(version * 10 ** 9, version * 10 ** 9))
+
+
+def test_vocabulary_precomputes_metadata():
+    vocab = Vocabulary(3, {"p": ["Pencil", "Happy", "Pencil"], "b": ["Ball", "Happy"], "k": [" Ice Cream "]})
+
+    assert vocab.words == ("Pencil", "Happy", "Ball", "Ice Cream")
+    assert vocab.word_sounds["Happy"] == ("p", "b")
+    assert vocab.normalized["Ice Cream"] == "ice cream" and vocab.lengths["Pencil"] == 6
+    assert vocab.candidates(["b", "x"]) == ("Happy", "Ball")
+    assert vocab.candidates(["x"]) == ()
+    with pytest.raises(TypeError):
+        vocab.sound_words["t"] = ("Table",)
+
+
+def test_store_swaps_only_changed_and_valid_vocabularies(tmp_path):
+    path = tmp_path / "vocabulary.json"
+    write_vocabulary(path, 1, {"p": ["Pencil"]})
+    store = VocabularyStore(FileSource(str(path)),
+                            validator=lambda vocab: [word for word in vocab.words if word == "Zzyzx"],
+                            check_interval=0)
+
+    first = store.current
+    assert first.version == 1
+    assert store.reload() is False  # unchanged file
+
+    write_vocabulary(path, 2, {"p": ["Pencil", "Zzyzx"]})
+    with pytest.raises(VocabularyError) as error:
+        store.reload()
+    assert error.value.unknown_words == ["Zzyzx"]
+    assert store.current is first
+
+    write_vocabulary(path, 3, {"p": ["Pencil", "Paper"]})
+    assert store.reload() is True
+    assert store.current.version == 3 and first.words == ("Pencil",)
+
+
+def test_first_load_is_checked_against_the_model_in_the_background(tmp_path):
+    path = tmp_path / "vocabulary.json"
+    write_vocabulary(path, 1, {"p": ["Pencil", "Zzyzx"]})
+    model_loaded = threading.Event()
+    checked = threading.Event()
+
+    def validator(vocab):
+        model_loaded.wait(5)  # e.g. loading the speech model
+        checked.set()
+        return [word for word in vocab.words if word == "Zzyzx"]
+
+    store = VocabularyStore(FileSource(str(path)), validator=validator, check_interval=0)
+    assert store.current.words == ("Pencil", "Zzyzx")  # served without waiting on the check
+    assert not checked.is_set()
+
+    model_loaded.set()
+    assert checked.wait(5)
+    for _ in range(100):
+        if store.stats()["unknown_words"]:
+            break
+        time.sleep(0.01)
+    assert store.stats()["unknown_words"] == ["Zzyzx"] and "not in the speech model" in store.stats()["last_error"]
+
+
+def test_collection_source_uses_latest_version():
+    collection = mongomock.MongoClient().db.vocabulary
+    collection.insert_many([{"version": 1, "sounds": {"p": ["Pencil"]}}, {"version": 2, "sounds": {"b": ["Ball"]}}])
+    store = VocabularyStore(CollectionSource(collection), check_interval=0)
+
+    assert store.current.version == 2
+    assert store.current.words == ("Ball",)
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import mongomock
+
+from vocabulary import Vocabulary
+from word_stats import run
+
+VOCAB = Vocabulary(1, {"p": ["Pencil", "Happy"], "b": ["Ball", "Happy"]})
+
+
+def attempt(word, accuracy, day):
+    return {"target_word": word, "spoken_word": word, "accuracy": accuracy, "score": 0,
+            "timestamp": datetime(2024, 1, day)}
+
+
+def test_incremental_refresh_from_watermark():
+    db = mongomock.MongoClient().db
+    db.sp1.insert_many([
+        {"email": "a@example.com", "scores": [attempt("Pencil", 100, 1), attempt("Happy", 40, 1)]},
+        {"email": "b@example.com", "scores": [attempt("Pencil", 20, 2), attempt("Custom", 90, 3)]},
+    ])
+
+    report = run(db.sp1, db.word_daily_stats, db.word_difficulty, db.analytics_state, VOCAB,
+                 now=datetime(2024, 1, 3, 9))
+    # Today's attempts wait for the day to finish
+    assert report["daily_rows"] == 3
+    pencil = db.word_difficulty.find_one({"_id": "word:Pencil"})
+    assert pencil["attempts"] == 2 and pencil["mean_accuracy"] == 60 and pencil["failure_rate"] == 0.5
+    sound_p = db.word_difficulty.find_one({"_id": "sound:p"})
+    assert sound_p["attempts"] == 3 and sound_p["failure_rate"] == round(2 / 3, 4)
+    assert db.word_difficulty.find_one({"_id": "sound:b"})["attempts"] == 1
+
+    db.sp1.update_one({"email": "a@example.com"}, {"$push": {"scores": attempt("Ball", 80, 3)}})
+    report = run(db.sp1, db.word_daily_stats, db.word_difficulty, db.analytics_state, VOCAB,
+                 now=datetime(2024, 1, 4, 9))
+    assert report["from"] == datetime(2024, 1, 3) and report["daily_rows"] == 2
+
+    custom = db.word_difficulty.find_one({"_id": "word:Custom"})
+    assert custom["custom"] and custom["sounds"] == []
+    assert db.word_difficulty.find_one({"_id": "sound:b"})["attempts"] == 2
+    # Earlier days were not double counted
+    assert db.word_difficulty.find_one({"_id": "word:Pencil"})["attempts"] == 2
@@ -0,0 +1,114 @@
+"""
+Energy based voice-activity gate that sits between the upload reader and the recognizer.
+"""
+
+from collections import deque
+
+from recognition import AudioError, np
+
+# Samples at or above this level count as clipped
+CLIP_LEVEL = 32700
+
+
+class EnergyGate:
+    """
+    Trims leading and trailing silence from a stream of 16-bit mono PCM chunks
+    and rejects recordings with no speech or heavy clipping.
+
+    Frame energies are computed with numpy a chunk at a time. Nothing reaches
+    the recognizer until speech has been confirmed and checked for clipping,
+    so silent or clipped recordings are rejected before any decoding.
+    """
+
+    def __init__(self, sample_rate, threshold_db=-40.0, max_clipped_ratio=0.01,
+                 frame_ms=20, pad_ms=200, min_speech_ms=60, confirm_ms=300):
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.frame_bytes = self.frame_samples * 2
+        self.threshold_db = threshold_db
+        self.max_clipped_ratio = max_clipped_ratio
+        self.pad_frames = max(1, pad_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.confirm_frames = max(1, confirm_ms // frame_ms)
+
+        self.remainder = b''
+        self.total_frames = 0
+        self.speech_frames = 0
+        self.clipped_samples = 0
+        self.speech_run = 0
+        # Frames before speech starts: lead-in padding plus the speech run being confirmed
+        self.lead = deque(maxlen=self.pad_frames + self.min_speech_frames)
+        self.started = False
+        # Speech held back until the clipping check has seen enough of it
+        self.startup = []
+        self.confirmed = False
+        # Silence after speech, only sent on if more speech follows
+        self.trailing = []
+
+    @property
+    def speech_ratio(self):
+        return round(self.speech_frames / self.total_frames, 4) if self.total_frames else 0
+
+    def check_clipping(self):
+        if self.speech_frames and \
+                self.clipped_samples / (self.speech_frames * self.frame_samples) > self.max_clipped_ratio:
+            raise AudioError("Recording is clipped (too loud). Please hold the device further away and try again", 422)
+
+    def process(self, chunk):
+        data = self.remainder + chunk
+        count = len(data) // self.frame_bytes
+        self.remainder = data[count * self.frame_bytes:]
+        if not count:
+            return []
+
+        frames = np.frombuffer(data, dtype='<i2', count=count * self.frame_samples).reshape(count, self.frame_samples)
+        rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+        is_speech = 20 * np.log10(rms / 32768 + 1e-10) > self.threshold_db
+        clipped = np.count_nonzero(np.abs(frames.astype(np.int32)) >= CLIP_LEVEL, axis=1)
+
+        self.total_frames += count
+        self.speech_frames += int(np.count_nonzero(is_speech))
+        self.clipped_samples += int(clipped[is_speech].sum())
+
+        output = []
+        for index in range(count):
+            frame = data[index * self.frame_bytes:(index + 1) * self.frame_bytes]
+            if not self.started:
+                self.lead.append(frame)
+                self.speech_run = self.speech_run + 1 if is_speech[index] else 0
+                if self.speech_run >= self.min_speech_frames:
+                    self.started = True
+                    self.startup.extend(self.lead)
+            elif is_speech[index]:
+                output.extend(self.trailing)
+                output.append(frame)
+                self.trailing = []
+            else:
+                self.trailing.append(frame)
+
+        if self.started and not self.confirmed:
+            self.startup.extend(output)
+            output = []
+            if len(self.startup) >= self.confirm_frames:
+                self.check_clipping()
+                self.confirmed = True
+                output, self.startup = self.startup, []
+        return output
+
+    def finish(self):
+        if not self.started:
+            raise AudioError("No speech detected in the recording", 422)
+        self.check_clipping()
+        output = self.startup + self.trailing[:self.pad_frames]
+        self.startup = []
+        self.trailing = []
+        return output
+
+    def filter(self, chunks):
+        """Wrap a PCM chunk iterator, yielding only the audio worth decoding."""
+        for chunk in chunks:
+            frames = self.process(chunk)
+            if frames:
+                yield b''.join(frames)
+        frames = self.finish()
+        if frames:
+            yield b''.join(frames)
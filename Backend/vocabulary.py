@@ -0,0 +1,211 @@
+"""
+Practice vocabulary loaded from a versioned file or collection.
+
+Each load builds an immutable Vocabulary with the per-sound word lists and
+the metadata derived from them. Reloads build the new one off to the side,
+check it against the speech model and then swap the reference, so requests
+never wait on a reload and never see a half-built word list. The very first
+load has nothing to fall back on, so it is swapped in straight away and
+checked on a background thread (loading the model can take a while).
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+
+class VocabularyError(Exception):
+    def __init__(self, message, unknown_words=()):
+        super().__init__(message)
+        self.unknown_words = list(unknown_words)
+
+
+def normalize_word(word):
+    # The form the recognizer produces: lower case, single spaces
+    return ' '.join(word.lower().split())
+
+
+class Vocabulary:
+    """
+    Word lists by sound plus precomputed lookups:
+
+    sound_words  sound -> words practising it
+    word_sounds  word -> sounds it practises
+    normalized   word -> recognizer form
+    lengths      word -> length of the recognizer form
+    """
+
+    def __init__(self, version, sounds):
+        sound_words = {}
+        word_sounds = {}
+        for sound, words in sounds.items():
+            unique = tuple(dict.fromkeys(word.strip() for word in words if word and word.strip()))
+            sound_words[sound.lower()] = unique
+            for word in unique:
+                word_sounds.setdefault(word, []).append(sound.lower())
+        if not word_sounds:
+            raise VocabularyError("Vocabulary has no words")
+
+        self.version = version
+        self.sound_words = MappingProxyType(sound_words)
+        self.word_sounds = MappingProxyType({word: tuple(found) for word, found in word_sounds.items()})
+        self.words = tuple(word_sounds)
+        self.normalized = MappingProxyType({word: normalize_word(word) for word in self.words})
+        self.lengths = MappingProxyType({word: len(form) for word, form in self.normalized.items()})
+        # Candidate lists per combination of sounds, filled on first use (shared by request threads)
+        self._candidates = {}
+        self._candidates_lock = threading.Lock()
+
+    @classmethod
+    def from_document(cls, document):
+        if not isinstance(document, dict) or 'version' not in document or not isinstance(document.get('sounds'), dict):
+            raise VocabularyError("Vocabulary needs a version and a sounds object")
+        return cls(document['version'], document['sounds'])
+
+    def candidates(self, selected_sounds):
+        """Words practising any of the selected sounds (unknown sounds are ignored)."""
+        key = frozenset(sound for sound in selected_sounds if sound in self.sound_words)
+        words = self._candidates.get(key)
+        if words is None:
+            with self._candidates_lock:
+                words = self._candidates.get(key)
+                if words is None:
+                    words = tuple(word for word in self.words if key.intersection(self.word_sounds[word]))
+                    self._candidates[key] = words
+        return words
+
+
+class FileSource:
+    def __init__(self, path):
+        self.path = path
+
+    def fingerprint(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+
+class CollectionSource:
+    # Documents of {version, sounds}; the highest version is the live one
+    def __init__(self, collection):
+        self.collection = collection
+
+    def latest(self, projection=None):
+        return self.collection.find_one({}, projection, sort=[("version", -1)])
+
+    def fingerprint(self):
+        document = self.latest({"_id": 0, "version": 1})
+        return document and document.get("version")
+
+    def load(self):
+        document = self.latest({"_id": 0})
+        if document is None:
+            raise VocabularyError("No vocabulary documents found")
+        return document
+
+
+class VocabularyStore:
+    """
+    Holds the live Vocabulary. The source is checked for changes at most
+    every `check_interval` seconds, on a background thread, and a vocabulary
+    that fails validation is never swapped in.
+    """
+
+    def __init__(self, source, validator=None, check_interval=30):
+        self.source = source
+        self.validator = validator
+        self.check_interval = check_interval
+        self._vocabulary = None
+        self.fingerprint = None
+        self.checked_at = 0
+        self.last_error = None
+        self.reloads = 0
+        self.unknown_words = []
+        self.lock = threading.Lock()
+        self.reloading = False
+
+    @property
+    def current(self):
+        vocabulary = self._vocabulary
+        if vocabulary is None:
+            # A request is waiting: load now and check against the model afterwards
+            if self.reload(validate=False) and self.validator:
+                self.validate_in_background(self._vocabulary)
+            return self._vocabulary
+        if self.check_interval and time.monotonic() - self.checked_at > self.check_interval:
+            self.reload_in_background()
+        return vocabulary
+
+    def reload(self, force=False, validate=True):
+        """Load the source if it changed (or always with force). Returns True when swapped."""
+        with self.lock:
+            self.checked_at = time.monotonic()
+            fingerprint = self.source.fingerprint()
+            if not force and self._vocabulary is not None and fingerprint == self.fingerprint:
+                return False
+
+            vocabulary = Vocabulary.from_document(self.source.load())
+            unknown = self.validator(vocabulary) if self.validator and validate else []
+            if unknown:
+                raise VocabularyError(f"{len(unknown)} words are not in the speech model's vocabulary", unknown)
+
+            self._vocabulary = vocabulary
+            self.fingerprint = fingerprint
+            self.reloads += 1
+            self.last_error = None
+            self.unknown_words = []
+            return True
+
+    def validate_in_background(self, vocabulary):
+        # There is no older vocabulary to keep, so unknown words are reported rather than rejected
+        def run():
+            try:
+                unknown = self.validator(vocabulary)
+            except Exception as e:
+                self.last_error = f"Could not check the vocabulary against the speech model: {e}"
+                logger.warning(self.last_error)
+                return
+            if unknown and self._vocabulary is vocabulary:
+                self.unknown_words = list(unknown)
+                self.last_error = f"{len(unknown)} words are not in the speech model's vocabulary"
+                logger.warning("%s: %s", self.last_error, ', '.join(unknown))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def reload_in_background(self):
+        with self.lock:
+            if self.reloading:
+                return
+            self.reloading = True
+            self.checked_at = time.monotonic()
+
+        def run():
+            try:
+                if self.reload():
+                    logger.info("Vocabulary reloaded (version %s)", self._vocabulary.version)
+            except Exception as e:  # keep serving the current vocabulary
+                self.last_error = str(e)
+                logger.warning("Vocabulary reload failed: %s", e)
+            finally:
+                self.reloading = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stats(self):
+        vocabulary = self._vocabulary
+        return {
+            "version": vocabulary.version if vocabulary else None,
+            "words": len(vocabulary.words) if vocabulary else 0,
+            "sounds": list(vocabulary.sound_words) if vocabulary else [],
+            "reloads": self.reloads,
+            "unknown_words": self.unknown_words,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,147 @@
+"""
+Batch job that materializes word and sound difficulty across all users.
+
+Attempts are grouped server-side into one row per (word, day) in
+word_daily_stats, starting from the watermark (the first day not yet
+complete at the previous run) and stopping before today. The rows are
+written with $set, so a rerun after a failure recomputes the same days
+instead of double counting. The small word_difficulty collection is then
+rebuilt from the daily rows: one document per word and per sound, with
+attempts, mean accuracy and failure rate.
+
+Usage:
+    MONGO_URI="mongodb+srv://..." python word_stats.py
+    python word_stats.py --full   # ignore the watermark and recompute every day
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime, time
+
+from pymongo import MongoClient, UpdateOne
+
+from vocabulary import CollectionSource, FileSource, Vocabulary
+
+STATE_ID = 'word_difficulty'
+# Same threshold play_game uses to take a life
+FAILURE_ACCURACY = 50
+
+
+def ensure_word_stats_indexes(users, daily):
+    users.create_index([("scores.timestamp", 1)])
+    daily.create_index([("word", 1), ("day", 1)], unique=True)
+
+
+def daily_pipeline(start, end):
+    window = {"$lt": end} if start is None else {"$gte": start, "$lt": end}
+    return [
+        {"$match": {"scores.timestamp": window}},
+        {"$project": {"_id": 0, "scores.target_word": 1, "scores.accuracy": 1, "scores.timestamp": 1}},
+        {"$unwind": "$scores"},
+        {"$match": {"scores.timestamp": window, "scores.target_word": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": {"word": "$scores.target_word", "day": "$scores.timestamp"},
+            "attempts": {"$sum": 1},
+            "accuracy_sum": {"$sum": "$scores.accuracy"},
+            "failures": {"$sum": {"$cond": [{"$lt": ["$scores.accuracy", FAILURE_ACCURACY]}, 1, 0]}}
+        }}
+    ]
+
+
+def refresh_daily(users, daily, start, end, batch_size=1000):
+    operations = []
+    rows = 0
+    for row in users.aggregate(daily_pipeline(start, end), allowDiskUse=True, batchSize=batch_size):
+        key = {"word": row["_id"]["word"], "day": row["_id"]["day"]}
+        operations.append(UpdateOne(key, {"$set": dict(key, attempts=row["attempts"], accuracy_sum=row["accuracy_sum"],
+                                                       failures=row["failures"])}, upsert=True))
+        if len(operations) >= batch_size:
+            daily.bulk_write(operations, ordered=False)
+            rows += len(operations)
+            operations = []
+    if operations:
+        daily.bulk_write(operations, ordered=False)
+        rows += len(operations)
+    return rows
+
+
+def difficulty_row(kind, key, attempts, accuracy_sum, failures, **extra):
+    return dict({
+        "_id": f"{kind}:{key}", "kind": kind, "key": key, "attempts": attempts,
+        "mean_accuracy": round(accuracy_sum / attempts, 2) if attempts else 0,
+        "failure_rate": round(failures / attempts, 4) if attempts else 0
+    }, **extra)
+
+
+def rebuild_difficulty(daily, difficulty, vocab, refreshed_at):
+    words = {}
+    totals = daily.aggregate([{"$group": {"_id": "$word", "attempts": {"$sum": "$attempts"},
+                                          "accuracy_sum": {"$sum": "$accuracy_sum"}, "failures": {"$sum": "$failures"}}}])
+    for row in totals:
+        words[row["_id"]] = (row["attempts"], row["accuracy_sum"], row["failures"])
+
+    rows = []
+    sounds = {}
+    for word, (attempts, accuracy_sum, failures) in words.items():
+        word_sounds = list(vocab.word_sounds.get(word, ()))
+        rows.append(difficulty_row("word", word, attempts, accuracy_sum, failures, sounds=word_sounds,
+                                   custom=word not in vocab.word_sounds, refreshed_at=refreshed_at))
+        for sound in word_sounds:
+            total = sounds.setdefault(sound, [0, 0, 0])
+            total[0] += attempts
+            total[1] += accuracy_sum
+            total[2] += failures
+    for sound, (attempts, accuracy_sum, failures) in sounds.items():
+        rows.append(difficulty_row("sound", sound, attempts, accuracy_sum, failures, refreshed_at=refreshed_at))
+
+    if rows:
+        difficulty.bulk_write([UpdateOne({"_id": row["_id"]}, {"$set": row}, upsert=True) for row in rows],
+                              ordered=False)
+    # Words that no longer have any attempts (e.g. a deleted user's custom words)
+    difficulty.delete_many({"refreshed_at": {"$ne": refreshed_at}})
+    return len(rows)
+
+
+def run(users, daily, difficulty, state, vocab, full=False, now=None):
+    """Refresh from the watermark up to the start of today. Returns a small report."""
+    now = now or datetime.now()
+    today = datetime.combine(now.date(), time.min)
+    ensure_word_stats_indexes(users, daily)
+
+    document = state.find_one({"_id": STATE_ID}) or {}
+    start = None if full else document.get("watermark")
+    daily_rows = refresh_daily(users, daily, start, today) if start is None or start < today else 0
+    difficulty_rows = rebuild_difficulty(daily, difficulty, vocab, now)
+
+    # Only moved on once everything above is written
+    state.update_one({"_id": STATE_ID}, {"$set": {"watermark": today, "refreshed_at": now}}, upsert=True)
+    return {"from": start, "to": today, "daily_rows": daily_rows, "difficulty_rows": difficulty_rows}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh the word and sound difficulty stats.')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI'), help='MongoDB connection string')
+    parser.add_argument('--vocabulary', default=os.environ.get(
+        'VOCABULARY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vocabulary.json')),
+        help='vocabulary file used to map words to sounds')
+    parser.add_argument('--full', action='store_true', help='recompute every day instead of starting at the watermark')
+    args = parser.parse_args(argv)
+
+    if not args.mongo_uri:
+        parser.error("--mongo-uri or MONGO_URI is required")
+
+    db = MongoClient(args.mongo_uri).get_default_database('spello_database')
+    if os.environ.get('VOCABULARY_SOURCE') == 'mongo':
+        vocab = Vocabulary.from_document(CollectionSource(db.vocabulary).load())
+    else:
+        vocab = Vocabulary.from_document(FileSource(args.vocabulary).load())
+    report = run(db.sp1, db.word_daily_stats, db.word_difficulty, db.analytics_state, vocab, full=args.full)
+    since = report["from"].strftime('%Y-%m-%d') if report["from"] else 'the beginning'
+    print(f"Refreshed {report['daily_rows']} word/day rows from {since} to {report['to'].strftime('%Y-%m-%d')}, "
+          f"{report['difficulty_rows']} difficulty rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())